@@ -0,0 +1,126 @@
+"""Модуль с пакетным добавлением в избранное, корзину и подписки."""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+from users.models import CustomUser, Follow
+from .timeline import backfill, followers_changed
+
+ADDED = 'added'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+def get_results(ids, statuses):
+    """Результаты по каждому id в порядке запроса."""
+    return [{'id': pk, 'status': statuses.get(pk, NOT_FOUND)} for pk in ids]
+
+
+def can_return_inserted():
+    """Поддерживает ли база INSERT ... ON CONFLICT DO NOTHING RETURNING."""
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def insert_row(model, user, field, pk):
+    """
+    Вставка одной строки без сигналов; False, если она уже есть.
+
+    Побочные эффекты вставки применяет вызывающий код, поэтому строка
+    пишется через bulk_create, а конфликт ловится в точке сохранения.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([model(user=user, **{field: pk})])
+    except IntegrityError:
+        return False
+    return True
+
+
+def insert_missing(model, user, field, ids):
+    """
+    Вставка связей пользователя с записями, которых у него ещё нет.
+
+    Возвращает id записей, строки для которых действительно вставлены:
+    строку, вставленную параллельным запросом, база пропускает, и
+    побочные эффекты для неё повторно не применяются.
+    """
+    if not ids:
+        return []
+    if not can_return_inserted():
+        return [
+            pk for pk in ids if insert_row(model, user, field, pk)
+        ]
+    quote = connection.ops.quote_name
+    column = quote(model._meta.get_field(field).column)
+    values = ', '.join(['(%s, %s)'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote(model._meta.get_field("user").column)}, {column}) '
+            f'VALUES {values} ON CONFLICT DO NOTHING RETURNING {column}',
+            [value for pk in ids for value in (user.pk, pk)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_statuses(found, added):
+    """Статусы найденных записей: добавлена или уже была."""
+    added = set(added)
+    return {pk: ADDED if pk in added else EXISTS for pk in found}
+
+
+@transaction.atomic
+def add_recipe_relations(model, user, ids):
+    """
+    Добавление рецептов в избранное или корзину пользователя.
+
+    Существование рецептов проверяется одним запросом, строки вставляются
+    одним запросом. Вставка идёт в обход сигналов, поэтому счётчики
+    рецептов и список покупок обновляются здесь же и только для
+    действительно вставленных строк.
+    """
+    found = list(Recipe.objects.filter(pk__in=ids).values_list(
+        'pk', flat=True
+    ))
+    added = insert_missing(model, user, 'recipe_id', found)
+    if added:
+        field = RECIPE_COUNTERS[model]
+        Recipe.objects.filter(pk__in=added).update(
+            **{field: F(field) + 1}
+        )
+        if model is ShoppingCart:
+            ShoppingListItem.objects.add_recipes(user.pk, added)
+    return get_results(ids, get_statuses(found, added))
+
+
+@transaction.atomic
+def add_follows(user, ids):
+    """
+    Подписка пользователя на авторов.
+
+    Подписка на самого себя получает статус invalid. Счётчики
+    подписчиков и ленты обновляются здесь же, как и в сигналах Follow.
+    """
+    found = list(CustomUser.objects.filter(pk__in=ids).exclude(
+        pk=user.pk
+    ).values_list('pk', flat=True))
+    added = insert_missing(Follow, user, 'following_id', found)
+    statuses = get_statuses(found, added)
+    if user.pk in ids:
+        statuses[user.pk] = INVALID
+    if added:
+        CustomUser.objects.filter(pk__in=added).update(
+            followers_count=F('followers_count') + 1
+        )
+        followers_changed(added, 1)
+        backfill(user.pk, added)
+    return get_results(ids, statuses)
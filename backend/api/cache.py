@@ -0,0 +1,135 @@
+"""Модуль кэширования ответов с рецептами для анонимных пользователей."""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Параметры запроса, от которых зависит ответ анонимному пользователю.
+CACHED_QUERY_PARAMS = ('page', 'cursor', 'limit', 'author', 'tags')
+# Параметры, которые для анонимного пользователя ни на что не влияют.
+IGNORED_QUERY_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+GLOBAL_TAG = 'all'
+
+
+class RecipeResponseCache:
+    """
+    Кэш готовых ответов с инвалидацией по тэгам.
+
+    Каждой записи сопоставляется набор тэгов (рецепты, авторы, тэги
+    рецептов, область списка). Для тэга в кэше хранится токен версии;
+    запись действительна, пока токены всех её тэгов не изменились.
+    Инвалидация удаляет токены, поэтому не требует перебора ключей и
+    работает с любым бэкендом Django, в том числе locmem и file-based.
+    """
+
+    key_prefix = 'recipes-response'
+
+    def __init__(self, alias, timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def tag_key(self, tag):
+        return f'{self.key_prefix}:tag:{tag}'
+
+    def get_key(self, request, action, pk=None):
+        """Ключ записи или None, если запрос не кэшируется."""
+        params = request.query_params
+        if any(
+            name not in CACHED_QUERY_PARAMS + IGNORED_QUERY_PARAMS
+            for name in params
+        ):
+            return None
+        if action == 'retrieve':
+            query = f'pk={pk}'
+        else:
+            query = '&'.join((
+                f'page={params.get("page", "1")}',
+                f'cursor={params.get("cursor")}',
+                f'limit={params.get("limit", "")}',
+                f'author={params.get("author", "")}',
+                'tags=' + ','.join(sorted(set(params.getlist('tags')))),
+            ))
+        base_url = request.build_absolute_uri('/')
+        return f'{self.key_prefix}:{action}:{base_url}:{query}'
+
+    def get_scope_tags(self, request, action):
+        """Тэги, зависящие от области выборки, а не от её содержимого."""
+        if action == 'retrieve':
+            return {GLOBAL_TAG}
+        params = request.query_params
+        tags = {GLOBAL_TAG}
+        author = params.get('author')
+        slugs = params.getlist('tags')
+        if author:
+            tags.add(f'list:author:{author}')
+        tags.update(f'list:tag:{slug}' for slug in slugs)
+        if not author and not slugs:
+            tags.add('list:all')
+        return tags
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        tags = entry['tags']
+        current = self.cache.get_many([self.tag_key(tag) for tag in tags])
+        for tag, token in tags.items():
+            if current.get(self.tag_key(tag)) != token:
+                return None
+        return entry['data']
+
+    def set(self, key, data, tags):
+        tag_keys = {tag: self.tag_key(tag) for tag in tags}
+        current = self.cache.get_many(list(tag_keys.values()))
+        tokens = {}
+        for tag, tag_key in tag_keys.items():
+            token = current.get(tag_key)
+            if token is None:
+                self.cache.add(tag_key, uuid.uuid4().hex, timeout=None)
+                token = self.cache.get(tag_key)
+            tokens[tag] = token
+        self.cache.set(
+            key, {'data': data, 'tags': tokens}, timeout=self.timeout
+        )
+
+    def invalidate(self, *tags):
+        self.cache.delete_many([self.tag_key(tag) for tag in tags])
+
+
+def get_recipe_tags(recipe_data):
+    """Тэги по содержимому представления рецепта."""
+    tags = {
+        f'recipe:{recipe_data["id"]}',
+        f'author:{recipe_data["author"]["id"]}',
+    }
+    tags.update(f'tag:{tag["id"]}' for tag in recipe_data['tags'])
+    return tags
+
+
+def get_response_tags(data):
+    """Тэги по содержимому ответа списка или отдельного рецепта."""
+    if 'results' not in data:
+        return get_recipe_tags(data)
+    tags = set()
+    for recipe_data in data['results']:
+        tags.update(get_recipe_tags(recipe_data))
+    return tags
+
+
+def invalidate_recipe_lists(author_id, tag_slugs=()):
+    """Сброс списков, в которые попадает рецепт автора с тэгами."""
+    recipe_cache.invalidate(
+        'list:all',
+        f'list:author:{author_id}',
+        *(f'list:tag:{slug}' for slug in tag_slugs),
+    )
+
+
+recipe_cache = RecipeResponseCache(
+    settings.RECIPES_CACHE_ALIAS, settings.RECIPES_CACHE_TIMEOUT
+)
@@ -0,0 +1,106 @@
+"""Модуль с заранее подготовленными ответами для справочников."""
+import gzip
+import hashlib
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+
+
+class CatalogSnapshot:
+    """Версия справочника: строки, готовый JSON и его сжатая копия."""
+
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.rows_by_id = {row['id']: row for row in rows}
+        self.version = version
+        self.built_at = monotonic()
+        self.body = JSONRenderer().render(rows)
+        self.gzipped_body = gzip.compress(self.body)
+        digest = hashlib.sha1(self.body).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzipped_etag = f'"{digest}-gzip"'
+
+
+class Catalog:
+    """
+    Справочник, который сериализуется один раз на версию.
+
+    Версия увеличивается при изменении строк в этом процессе, а также
+    по истечении ttl, чтобы подхватить изменения других воркеров. ETag
+    вычисляется по содержимому, поэтому совпадает во всех воркерах.
+    """
+
+    def __init__(self, queryset, serializer_class, ttl):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.ttl = ttl
+        self._snapshot = None
+        self._version = 0
+        self._lock = Lock()
+
+    def invalidate(self):
+        self._version += 1
+
+    def is_actual(self, snapshot):
+        return (
+            snapshot is not None
+            and snapshot.version == self._version
+            and monotonic() - snapshot.built_at < self.ttl
+        )
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if self.is_actual(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if not self.is_actual(snapshot):
+                version = self._version
+                rows = self.serializer_class(
+                    self.queryset.all(), many=True
+                ).data
+                snapshot = CatalogSnapshot(rows, version)
+                self._snapshot = snapshot
+        return snapshot
+
+
+def get_catalog_response(request, catalog):
+    """Ответ со справочником с поддержкой If-None-Match и gzip."""
+    snapshot = catalog.get_snapshot()
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    etag = snapshot.gzipped_etag if use_gzip else snapshot.etag
+    if if_none_match.strip() == '*' or any(
+        tag.strip() in (snapshot.etag, snapshot.gzipped_etag)
+        for tag in if_none_match.split(',')
+    ):
+        response = HttpResponse(status=304)
+    elif use_gzip:
+        response = HttpResponse(
+            snapshot.gzipped_body, content_type='application/json'
+        )
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            snapshot.body, content_type='application/json'
+        )
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = (
+        f'public, max-age={settings.CATALOG_MAX_AGE}'
+    )
+    return response
+
+
+tag_catalog = Catalog(
+    Tag.objects.all(), TagSerializer, settings.CATALOG_TTL
+)
+ingredient_catalog = Catalog(
+    Ingredient.objects.all(), IngredientSerializer, settings.CATALOG_TTL
+)
@@ -1,9 +1,15 @@
 """Модуль кастомных фильтров для проекта."""
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import (
-    Recipe, Tag,
+    Recipe, RecipeIngredient, Tag,
 )
+from recipes.search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Фильтр по списку чисел через запятую."""
 
 
 class RecipeFilter(FilterSet):
@@ -17,7 +23,11 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='get_tags',
     )
+    ingredients = NumberInFilter(method='get_ingredients')
+    exclude_ingredients = NumberInFilter(method='get_exclude_ingredients')
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
@@ -35,3 +45,31 @@ class RecipeFilter(FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    # Фильтры по связанным таблицам выполняются подзапросами EXISTS, а не
+    # JOIN, поэтому строки рецептов не размножаются и DISTINCT не нужен.
+    def get_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тэгов."""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
+    def get_ingredients(self, queryset, name, value):
+        """Рецепты, в которых есть все перечисленные ингредиенты."""
+        for ingredient_id in {int(pk) for pk in value}:
+            queryset = queryset.filter(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id=ingredient_id
+            )))
+        return queryset
+
+    def get_exclude_ingredients(self, queryset, name, value):
+        """Рецепты без перечисленных ингредиентов."""
+        return queryset.filter(~Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient_id__in=[int(pk) for pk in value]
+        )))
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        return search_recipes(queryset, value)
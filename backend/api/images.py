@@ -0,0 +1,154 @@
+"""Модуль с обработкой загружаемых изображений."""
+import base64
+import binascii
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+# Размер куска base64-строки, кратный 4, чтобы куски декодировались
+# независимо друг от друга.
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+# Подкаталог вариантов рядом с оригиналом.
+VARIANTS_DIR = 'variants'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+)
+
+
+def decode_base64_file(data, name):
+    """
+    Декодирование base64 по частям во временный файл.
+
+    Размер результата ограничен IMAGE_MAX_UPLOAD_SIZE, слишком большие
+    данные отклоняются до начала декодирования.
+    """
+    max_size = settings.IMAGE_MAX_UPLOAD_SIZE
+    if len(data) // 4 * 3 > max_size + 2:
+        raise serializers.ValidationError(
+            f'Размер изображения не должен превышать {max_size} байт.'
+        )
+    buffer = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for start in range(0, len(data), DECODE_CHUNK_SIZE):
+            buffer.write(base64.b64decode(
+                data[start:start + DECODE_CHUNK_SIZE], validate=True
+            ))
+    except (binascii.Error, ValueError):
+        buffer.close()
+        raise serializers.ValidationError(
+            'Некорректные данные изображения.'
+        )
+    buffer.seek(0)
+    return File(buffer, name=name)
+
+
+def get_variant_name(name, variant):
+    """Путь варианта изображения рядом с оригиналом."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    extension = settings.IMAGE_VARIANT_FORMAT.lower()
+    return os.path.join(
+        directory, VARIANTS_DIR, f'{stem}_{variant}.{extension}'
+    )
+
+
+def generate_variants(name):
+    """Создание уменьшенных копий изображения во всех размерах."""
+    try:
+        with default_storage.open(name) as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        if settings.IMAGE_VARIANT_FORMAT == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            variant_name = get_variant_name(name, variant)
+            if default_storage.exists(variant_name):
+                continue
+            copy = image.copy()
+            copy.thumbnail(size)
+            content = BytesIO()
+            copy.save(
+                content, settings.IMAGE_VARIANT_FORMAT,
+                quality=settings.IMAGE_VARIANT_QUALITY,
+            )
+            default_storage.save(variant_name, ContentFile(content.getvalue()))
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+
+
+def schedule_variants(name):
+    """Постановка обработки изображения в очередь после коммита."""
+    if name:
+        transaction.on_commit(lambda: executor.submit(generate_variants, name))
+
+
+def delete_variants(name):
+    """Удаление уменьшенных копий изображения."""
+    for variant in settings.IMAGE_VARIANTS:
+        default_storage.delete(get_variant_name(name, variant))
+
+
+def get_references_count(name):
+    """Число записей, ссылающихся на файл изображения."""
+    return (
+        Recipe.objects.filter(image=name).count()
+        + CustomUser.objects.filter(avatar=name).count()
+    )
+
+
+def release_image(name):
+    """Удаление файла и его копий, если на него больше никто не ссылается."""
+    if not name:
+        return
+    # Под той же блокировкой хранилище переиспользует и восстанавливает
+    # файлы, поэтому подсчёт ссылок и удаление не чередуются с ними.
+    with default_storage.lock(name):
+        if not get_references_count(name):
+            delete_variants(name)
+            default_storage.delete(name)
+
+
+def schedule_release(name):
+    """Освобождение файла изображения после коммита."""
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+def get_variant_urls(field_file, request=None):
+    """
+    Ссылки на варианты изображения.
+
+    Пока вариант не создан, вместо него отдаётся ссылка на оригинал.
+    """
+    if not field_file:
+        return None
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        variant_name = get_variant_name(field_file.name, variant)
+        if default_storage.exists(variant_name):
+            url = default_storage.url(variant_name)
+        else:
+            url = field_file.url
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls[variant] = url
+    return urls
@@ -0,0 +1,249 @@
+"""Модуль с индексами в памяти для быстрого поиска."""
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from recipes.models import RecipeIngredient
+from .catalogs import ingredient_catalog
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pantry')
+
+
+def normalize_name(name):
+    """Приведение названия к виду для сравнения без учёта регистра."""
+    return name.casefold().replace('ё', 'е').strip()
+
+
+class IngredientIndexState:
+    """Снимок каталога ингредиентов с префиксным и n-граммным индексом."""
+
+    def __init__(self, snapshot, ngram_size):
+        self.snapshot = snapshot
+        self.ngram_size = ngram_size
+        rows = sorted(
+            snapshot.rows, key=lambda row: normalize_name(row['name'])
+        )
+        self.rows = rows
+        self.keys = [normalize_name(row['name']) for row in rows]
+        self.ngrams = defaultdict(set)
+        for position, key in enumerate(self.keys):
+            for size in range(1, ngram_size + 1):
+                for start in range(len(key) - size + 1):
+                    self.ngrams[key[start:start + size]].add(position)
+
+    def get_candidates(self, query):
+        """Позиции названий, содержащих все n-граммы запроса."""
+        size = self.ngram_size
+        if len(query) <= size:
+            return self.ngrams.get(query, ())
+        postings = sorted(
+            (self.ngrams.get(query[start:start + size], set())
+             for start in range(len(query) - size + 1)),
+            key=len,
+        )
+        return set.intersection(*postings)
+
+    def search(self, query):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        lower = bisect_left(self.keys, query)
+        upper = bisect_left(self.keys, query + '\uffff')
+        substring_matches = sorted(
+            (self.keys[position].find(query), position)
+            for position in self.get_candidates(query)
+            if not lower <= position < upper
+            and query in self.keys[position]
+        )
+        return self.rows[lower:upper] + [
+            self.rows[position] for _, position in substring_matches
+        ]
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов для автодополнения, общий для воркера.
+
+    Строится по текущей версии справочника ингредиентов и перестраивается
+    вместе с ней, поэтому поиск не обращается к базе данных.
+    """
+
+    ngram_size = 3
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._state = None
+        self._lock = Lock()
+
+    def get_state(self):
+        snapshot = self.catalog.get_snapshot()
+        state = self._state
+        if state is not None and state.snapshot is snapshot:
+            return state
+        with self._lock:
+            state = self._state
+            if state is None or state.snapshot is not snapshot:
+                state = IngredientIndexState(snapshot, self.ngram_size)
+                self._state = state
+        return state
+
+    def search(self, name):
+        return self.get_state().search(normalize_name(name))
+
+
+class PantryIndexState:
+    """Снимок обратного индекса рецептов по ингредиентам."""
+
+    def __init__(self, postings, recipes):
+        self.postings = postings
+        self.recipes = recipes
+        self.built_at = monotonic()
+
+
+class PantryIndex:
+    """
+    Обратный индекс рецептов по ингредиентам для подбора по продуктам.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - массив id его ингредиентов. Подбор считает
+    совпадения по массивам выбранных ингредиентов без обращения к базе.
+    Изменения рецептов этого воркера применяются к индексу точечно после
+    коммита, а изменения других воркеров подхватываются перестройкой
+    по истечении ttl. Перестройка идёт в фоне, старый снимок всё это
+    время обслуживает поиск и заменяется новым целиком.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._state = None
+        # id рецептов, изменённых во время фоновой перестройки.
+        self._changed = None
+        self._lock = Lock()
+        self._build_lock = Lock()
+
+    def build(self):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(lambda: array('q'))
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').distinct().iterator(
+            chunk_size=settings.PANTRY_INDEX_CHUNK_SIZE
+        ):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        return PantryIndexState(dict(postings), dict(recipes))
+
+    def rebuild(self):
+        """Построение нового снимка и замена им текущего."""
+        with self._lock:
+            self._changed = set()
+        try:
+            state = self.build()
+        finally:
+            with self._lock:
+                changed, self._changed = self._changed, None
+        with self._lock:
+            self._state = state
+        # Изменения, закоммиченные во время построения, могли не
+        # попасть в новый снимок, поэтому применяются к нему повторно.
+        for recipe_id in changed:
+            self.refresh_recipe(recipe_id)
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс продуктов')
+        finally:
+            self._build_lock.release()
+            connection.close()
+
+    def ensure_built(self):
+        state = self._state
+        if state is not None:
+            if (monotonic() - state.built_at >= self.ttl
+                    and self._build_lock.acquire(blocking=False)):
+                executor.submit(self.rebuild_in_background)
+            return
+        with self._build_lock:
+            if self._state is None:
+                self.rebuild()
+
+    def refresh_recipe(self, recipe_id):
+        """Замена ингредиентов рецепта в индексе по данным из базы."""
+        with self._lock:
+            if self._changed is not None:
+                self._changed.add(recipe_id)
+            elif self._state is None:
+                return
+        ingredient_ids = array('q', sorted(set(
+            RecipeIngredient.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', flat=True)
+        )))
+        with self._lock:
+            if self._state is None:
+                return
+            postings = self._state.postings
+            recipes = self._state.recipes
+            old_ids = recipes.pop(recipe_id, array('q'))
+            for ingredient_id in old_ids:
+                posting = postings[ingredient_id]
+                position = bisect_left(posting, recipe_id)
+                if (position < len(posting)
+                        and posting[position] == recipe_id):
+                    posting.pop(position)
+            if not ingredient_ids:
+                return
+            recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                posting = postings.setdefault(ingredient_id, array('q'))
+                position = bisect_left(posting, recipe_id)
+                if (position == len(posting)
+                        or posting[position] != recipe_id):
+                    posting.insert(position, recipe_id)
+
+    def schedule_refresh(self, recipe_id):
+        transaction.on_commit(lambda: self.refresh_recipe(recipe_id))
+
+    def search(self, ingredient_ids, limit):
+        """
+        Рецепты с наибольшей долей имеющихся ингредиентов.
+
+        Возвращает кортежи (id рецепта, число совпавших ингредиентов,
+        id недостающих ингредиентов).
+        """
+        self.ensure_built()
+        ingredient_ids = set(ingredient_ids)
+        with self._lock:
+            recipes = self._state.recipes
+            postings = self._state.postings
+            matches = Counter()
+            for ingredient_id in ingredient_ids:
+                matches.update(postings.get(ingredient_id, ()))
+            best = heapq.nlargest(
+                limit, matches.items(),
+                key=lambda item: (
+                    item[1] / len(recipes[item[0]]), item[1], item[0]
+                ),
+            )
+            return [
+                (
+                    recipe_id, matched,
+                    [pk for pk in recipes[recipe_id]
+                     if pk not in ingredient_ids],
+                )
+                for recipe_id, matched in best
+            ]
+
+
+ingredient_index = IngredientIndex(ingredient_catalog)
+pantry_index = PantryIndex(settings.PANTRY_INDEX_TTL)
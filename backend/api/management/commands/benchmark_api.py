@@ -0,0 +1,185 @@
+"""Модуль с командой замера времени ответа основных эндпоинтов."""
+import json
+import statistics
+import sys
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Tag
+from users.models import CustomUser
+
+
+def get_endpoints(tag, ingredient):
+    """Имена и адреса замеряемых эндпоинтов."""
+    prefix = ingredient.name[:3] if ingredient else 'а'
+    slug = tag.slug if tag else ''
+    return (
+        ('recipes-list', '/api/recipes/', True),
+        ('recipes-list-anonymous', '/api/recipes/?page=3', False),
+        ('recipes-list-filtered',
+         f'/api/recipes/?tags={slug}&is_favorited=1', True),
+        ('recipes-list-cart', '/api/recipes/?is_in_shopping_cart=1', True),
+        ('recipes-list-deep-page', '/api/recipes/?page=200&limit=6', True),
+        ('recipes-list-cursor', '/api/recipes/?cursor=&limit=6', True),
+        ('recipes-feed', '/api/recipes/feed/?limit=6', True),
+        ('users-subscriptions',
+         '/api/users/subscriptions/?recipes_limit=3', True),
+        ('download-shopping-cart',
+         '/api/recipes/download_shopping_cart/', True),
+        ('ingredients-search', f'/api/ingredients/?name={prefix}', False),
+    )
+
+
+def get_percentile(cut_points, percent):
+    return round(cut_points[percent - 1] * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержек p50/p95/p99 и числа SQL-запросов основных '
+        'эндпоинтов с выводом результата в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Число замеряемых запросов к каждому эндпоинту',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Число прогревочных запросов перед замером',
+        )
+        parser.add_argument(
+            '--base-url',
+            help=(
+                'Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                'Без него запросы выполняются через тестовый клиент Django'
+            ),
+        )
+        parser.add_argument(
+            '--email',
+            help='Почта пользователя для авторизованных запросов',
+        )
+        parser.add_argument(
+            '--output', help='Файл для результата, по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('Нужно не меньше двух запросов на эндпоинт')
+        user = self.get_user(options['email'])
+        token = Token.objects.get_or_create(user=user)[0].key
+        self.base_url = options['base_url']
+        if self.base_url is None:
+            setup_test_environment()
+            self.client = Client()
+
+        results = {}
+        for name, url, authorized in get_endpoints(
+            Tag.objects.first(), Ingredient.objects.order_by('?').first()
+        ):
+            headers = {'Authorization': f'Token {token}'} if authorized else {}
+            for _ in range(options['warmup']):
+                self.request(url, headers)
+            durations = []
+            queries = []
+            statuses = set()
+            for _ in range(options['requests']):
+                duration, status, count = self.request(url, headers)
+                durations.append(duration)
+                statuses.add(status)
+                if count is not None:
+                    queries.append(count)
+            cut_points = statistics.quantiles(durations, n=100)
+            results[name] = {
+                'url': url,
+                'status': sorted(statuses),
+                'requests': len(durations),
+                'p50_ms': get_percentile(cut_points, 50),
+                'p95_ms': get_percentile(cut_points, 95),
+                'p99_ms': get_percentile(cut_points, 99),
+                'mean_ms': round(statistics.mean(durations) * 1000, 2),
+                'queries': max(queries) if queries else None,
+            }
+            self.stderr.write(
+                f'{name}: p50 {results[name]["p50_ms"]} мс, '
+                f'p95 {results[name]["p95_ms"]} мс, '
+                f'запросов {results[name]["queries"]}'
+            )
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'mode': self.base_url or 'test-client',
+            'user': user.email,
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                file.write(report + '\n')
+        else:
+            sys.stdout.write(report + '\n')
+
+    def get_user(self, email):
+        if email:
+            user = CustomUser.objects.filter(email=email).first()
+        else:
+            # Пользователь с наибольшей корзиной даёт самый тяжёлый список
+            # покупок и, как правило, есть в подписках у других.
+            user = CustomUser.objects.annotate(
+                cart_size=Count('shopping_cart')
+            ).order_by('-cart_size', '-followers_count').first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, сначала выполните generate_data'
+            )
+        return user
+
+    def request(self, url, headers):
+        """Время ответа, его статус и число SQL-запросов."""
+        if self.base_url is not None:
+            started = perf_counter()
+            try:
+                response = urlopen(
+                    Request(
+                        self.base_url + quote(url, safe='/?&='),
+                        headers=headers,
+                    )
+                )
+            except HTTPError as error:
+                response = error
+            with response:
+                response.read()
+            duration = perf_counter() - started
+            return duration, response.status, self.get_queries_count(
+                response.headers.get('Server-Timing', '')
+            )
+        meta = {
+            f'HTTP_{key.upper()}': value for key, value in headers.items()
+        }
+        with CaptureQueriesContext(connection) as context:
+            started = perf_counter()
+            response = self.client.get(url, **meta)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            duration = perf_counter() - started
+        return duration, response.status_code, len(context)
+
+    def get_queries_count(self, server_timing):
+        """Число запросов из описания метрики db в Server-Timing."""
+        for metric in server_timing.split(','):
+            name, *params = metric.strip().split(';')
+            if name != 'db':
+                continue
+            for param in params:
+                if param.startswith('desc='):
+                    return int(param[5:].strip('"').split()[0])
+        return None
@@ -0,0 +1,188 @@
+"""Модуль с командой проверки планов выполнения частых запросов."""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Sum
+
+from recipes.models import (
+    Favorite, Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem, Tag,
+    TimelineEntry
+)
+from users.models import CustomUser, Follow
+
+
+def get_hot_queries(user, tag, ingredient_ids):
+    """
+    Частые запросы проекта.
+
+    Для каждого запроса указаны таблицы, которые нельзя читать
+    последовательным сканированием, и допустима ли в плане сортировка.
+    """
+    recipe_table = Recipe._meta.db_table
+    feed = Recipe.objects.order_by('-pub_date', '-id')
+    return (
+        (
+            'Лента рецептов',
+            feed[:10],
+            (recipe_table,),
+            False,
+        ),
+        (
+            'Лента с флагами избранного и корзины',
+            feed.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )[:10],
+            (recipe_table, Favorite._meta.db_table,
+             ShoppingCart._meta.db_table),
+            False,
+        ),
+        (
+            'Рецепты автора',
+            feed.filter(author=user)[:10],
+            (recipe_table,),
+            False,
+        ),
+        (
+            'Фильтр по тэгу',
+            feed.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag=tag
+            )))[:10],
+            (recipe_table, Tag._meta.db_table,
+             Recipe.tags.through._meta.db_table),
+            False,
+        ),
+        (
+            'Фильтр по ингредиентам',
+            feed.filter(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id=ingredient_ids[0]
+            ))).exclude(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id__in=ingredient_ids[1:]
+            )))[:10],
+            (recipe_table, RecipeIngredient._meta.db_table),
+            False,
+        ),
+        (
+            'Фильтр избранного',
+            feed.filter(favorites__user=user)[:10],
+            (Favorite._meta.db_table,),
+            True,
+        ),
+        (
+            'Фильтр корзины',
+            feed.filter(shopping_cart__user=user)[:10],
+            (ShoppingCart._meta.db_table,),
+            True,
+        ),
+        (
+            'Сборка списка покупок',
+            RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            ).values('ingredient_id').annotate(total=Sum('amount')),
+            (RecipeIngredient._meta.db_table, ShoppingCart._meta.db_table),
+            True,
+        ),
+        (
+            'Выгрузка списка покупок',
+            ShoppingListItem.objects.filter(user=user),
+            (ShoppingListItem._meta.db_table,),
+            True,
+        ),
+        (
+            'Лента подписок',
+            TimelineEntry.objects.filter(user=user).order_by(
+                '-pub_date', '-recipe_id'
+            ).values_list('pub_date', 'recipe_id')[:10],
+            (TimelineEntry._meta.db_table,),
+            False,
+        ),
+        (
+            'Подписки пользователя',
+            Follow.objects.filter(user=user).order_by('id')[:10],
+            (Follow._meta.db_table,),
+            True,
+        ),
+    )
+
+
+def iter_plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from iter_plan_nodes(child)
+
+
+def get_plan_problems(plan, tables, allow_sort):
+    problems = []
+    for node in iter_plan_nodes(plan):
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan' and node.get('Relation Name') in tables:
+            problems.append(f'Seq Scan по {node["Relation Name"]}')
+        elif node_type in ('Sort', 'Incremental Sort') and not allow_sort:
+            problems.append(f'{node_type} по {", ".join(node["Sort Key"])}')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка через EXPLAIN, что частые запросы используют индексы, '
+        'а не последовательное сканирование и сортировку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Вывести планы всех запросов',
+        )
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов доступна только в PostgreSQL')
+        user = (
+            CustomUser.objects.filter(shopping_cart__isnull=False).first()
+            or CustomUser.objects.first()
+        )
+        tag = Tag.objects.first()
+        ingredient_ids = list(RecipeIngredient.objects.values_list(
+            'ingredient_id', flat=True
+        ).distinct()[:2])
+        if user is None or tag is None or len(ingredient_ids) < 2:
+            raise CommandError(
+                'В базе нет данных, сначала заполните её тестовыми данными'
+            )
+        failed = 0
+        # Без последовательного сканирования и сортировки планировщик
+        # выбирает их, только если подходящего индекса нет, поэтому
+        # проверка не зависит от объёма данных в базе.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            for name, queryset, tables, allow_sort in get_hot_queries(
+                user, tag, ingredient_ids
+            ):
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plan = plan[0]['Plan']
+                problems = get_plan_problems(plan, tables, allow_sort)
+                if problems:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: {"; ".join(problems)}'
+                    ))
+                else:
+                    self.stdout.write(f'{name}: OK')
+                if kwargs['show_plans'] or problems:
+                    self.stdout.write(json.dumps(
+                        plan, ensure_ascii=False, indent=2
+                    ))
+        if failed:
+            raise CommandError(f'Запросов с неверным планом: {failed}')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
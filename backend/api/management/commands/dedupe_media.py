@@ -0,0 +1,99 @@
+"""Модуль с командой переноса изображений в хранилище по содержимому."""
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from users.models import CustomUser
+from api.images import VARIANTS_DIR, release_image
+
+fields = (
+    (Recipe, 'image'),
+    (CustomUser, 'avatar'),
+)
+
+
+def walk_files(directory):
+    """
+    Имена всех файлов каталога хранилища, включая подкаталоги по хэшу.
+
+    Каталоги вариантов пропускаются: варианты удаляются вместе с
+    оригиналом.
+    """
+    directories, filenames = default_storage.listdir(directory)
+    for filename in filenames:
+        yield os.path.join(directory, filename)
+    for subdirectory in directories:
+        if subdirectory != VARIANTS_DIR:
+            yield from walk_files(os.path.join(directory, subdirectory))
+
+
+def get_stored_names():
+    """Имена файлов, на которые ссылаются записи."""
+    names = set()
+    for model, field in fields:
+        names.update(model.objects.exclude(
+            **{f'{field}__in': ('', None)}
+        ).values_list(field, flat=True).distinct().iterator())
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос загруженных изображений в хранилище по хэшу содержимого '
+        'с удалением дублей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-orphans',
+            action='store_true',
+            help='Удалить файлы, на которые не ссылается ни одна запись',
+        )
+
+    def handle(self, *args, **kwargs):
+        moved = missing = freed = 0
+        for model, field in fields:
+            names = model.objects.exclude(
+                **{f'{field}__in': ('', None)}
+            ).values_list(field, flat=True).distinct()
+            for name in names.iterator():
+                if not default_storage.is_content_addressed(name):
+                    continue
+                if not default_storage.exists(name):
+                    missing += 1
+                    continue
+                with default_storage.open(name) as file:
+                    if default_storage.exists(
+                        default_storage.get_hashed_name(name, file)
+                    ):
+                        freed += default_storage.size(name)
+                    new_name = default_storage.save(name, file)
+                for ref_model, ref_field in fields:
+                    ref_model.objects.filter(**{ref_field: name}).update(
+                        **{ref_field: new_name}
+                    )
+                release_image(name)
+                moved += 1
+        orphans = 0
+        if kwargs['delete_orphans']:
+            stored_names = get_stored_names()
+            for directory in settings.CONTENT_ADDRESSED_DIRS:
+                if not default_storage.exists(directory):
+                    continue
+                for name in walk_files(directory):
+                    if name in stored_names:
+                        continue
+                    # Ссылка могла появиться после чтения имён, поэтому
+                    # release_image проверяет её ещё раз под блокировкой.
+                    size = default_storage.size(name)
+                    release_image(name)
+                    if not default_storage.exists(name):
+                        freed += size
+                        orphans += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, не найдено: {missing}, '
+            f'удалено лишних: {orphans}. Освобождено байт: {freed}.'
+        ))
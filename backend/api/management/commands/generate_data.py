@@ -0,0 +1,270 @@
+"""Модуль с командой генерации тестовых данных большого объёма."""
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from time import monotonic
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from users.models import CustomUser, Follow
+from api.cache import GLOBAL_TAG, recipe_cache
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+WORDS = (
+    'суп', 'салат', 'пирог', 'паста', 'каша', 'рагу', 'запеканка',
+    'омлет', 'блины', 'котлеты', 'плов', 'соус', 'десерт', 'смузи',
+    'домашний', 'быстрый', 'летний', 'пряный', 'сытный', 'лёгкий',
+)
+
+
+def get_chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация пользователей, подписок, рецептов, избранного и корзин '
+        'в заданных объёмах для нагрузочных проверок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на пользователя',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у пользователя',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Рецептов в корзине у пользователя',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Ингредиентов в рецепте',
+        )
+        parser.add_argument('--days', type=int, default=365,
+                            help='Период публикации рецептов в днях')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int,
+            default=4 if connection.vendor == 'postgresql' else 1,
+            help='Число параллельных потоков записи',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = monotonic()
+
+        if not Ingredient.objects.exists():
+            call_command(
+                'import_csv', os.path.join(DATA_DIR, 'ingredients.csv'),
+                'ingredient', stdout=self.stdout,
+            )
+        if not Tag.objects.exists():
+            call_command(
+                'import_csv', os.path.join(DATA_DIR, 'tags.csv'), 'tag',
+                stdout=self.stdout,
+            )
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('pk', flat=True))
+
+        self.prefix = f'gen{CustomUser.objects.count()}'
+        user_ids = self.step('Пользователи', self.create_users)
+        if not user_ids:
+            raise CommandError('Не создано ни одного пользователя')
+        self.user_ids = user_ids
+        self.step('Подписки', self.create_follows)
+        self.image = self.get_placeholder_image()
+        self.recipe_ids = self.step('Рецепты', self.create_recipes)
+        self.step('Избранное', self.create_relations, Favorite,
+                  options['favorites'])
+        self.step('Корзины', self.create_relations, ShoppingCart,
+                  options['cart'])
+
+        # bulk_create не вызывает сигналы, поэтому производные данные
+        # пересчитываются целиком.
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('rebuild_timelines', stdout=self.stdout)
+        recipe_cache.invalidate(GLOBAL_TAG)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {monotonic() - started:.1f} с'
+        ))
+
+    def step(self, title, function, *args):
+        started = monotonic()
+        result = function(*args)
+        self.stdout.write(f'{title}: {monotonic() - started:.1f} с')
+        return result
+
+    def get_random(self, function, start):
+        """
+        Генератор случайных чисел пачки.
+
+        У каждой пачки свой генератор, зависящий от --seed, шага и начала
+        пачки, поэтому данные воспроизводимы при любом числе потоков.
+        """
+        seed = self.options['seed']
+        if seed is None:
+            return random.Random()
+        return random.Random(f'{seed}:{function.__qualname__}:{start}')
+
+    def run_parallel(self, function, total):
+        """Выполнение function(rng, start, count) по пачкам в потоках."""
+        def call(chunk):
+            return function(self.get_random(function, chunk[0]), *chunk)
+
+        def run(chunk):
+            try:
+                return call(chunk)
+            finally:
+                connections.close_all()
+
+        chunks = list(get_chunks(total, self.batch_size))
+        if self.options['workers'] <= 1:
+            return [call(chunk) for chunk in chunks]
+        with ThreadPoolExecutor(self.options['workers']) as executor:
+            return list(executor.map(run, chunks))
+
+    def create_users(self):
+        password = make_password('password')
+
+        def create(rng, start, count):
+            CustomUser.objects.bulk_create(
+                CustomUser(
+                    username=f'{self.prefix}_{number}',
+                    email=f'{self.prefix}_{number}@example.com',
+                    first_name=rng.choice(WORDS).title(),
+                    last_name=rng.choice(WORDS).title(),
+                    password=password,
+                )
+                for number in range(start, start + count)
+            )
+
+        self.run_parallel(create, self.options['users'])
+        # Порядок id не зависит от того, в каком порядке потоки
+        # записали пачки, и выбор авторов по --seed воспроизводим.
+        return list(CustomUser.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('username').values_list('pk', flat=True))
+
+    def create_follows(self):
+        follows = min(self.options['follows'], len(self.user_ids) - 1)
+        if follows <= 0:
+            return
+
+        def create(rng, start, count):
+            rows = []
+            for user_id in self.user_ids[start:start + count]:
+                for following_id in rng.sample(self.user_ids, follows):
+                    if following_id != user_id:
+                        rows.append(Follow(
+                            user_id=user_id, following_id=following_id
+                        ))
+            Follow.objects.bulk_create(rows, ignore_conflicts=True)
+
+        self.run_parallel(create, len(self.user_ids))
+
+    def get_placeholder_image(self):
+        content = BytesIO()
+        Image.new('RGB', (600, 400), (230, 180, 120)).save(content, 'JPEG')
+        return default_storage.save(
+            'recipe/images/generated.jpg', ContentFile(content.getvalue())
+        )
+
+    def create_recipes(self):
+        pub_date = Recipe._meta.get_field('pub_date')
+        ingredients = min(self.options['ingredients'],
+                          len(self.ingredient_ids))
+        period = self.options['days'] * 24 * 3600
+
+        def create(rng, start, count):
+            recipes = [
+                Recipe(
+                    author_id=rng.choice(self.user_ids),
+                    name=(
+                        f'{" ".join(rng.sample(WORDS, 2)).capitalize()} '
+                        f'{self.prefix}-{number}'
+                    ),
+                    image=self.image,
+                    text=' '.join(rng.choices(WORDS, k=40)),
+                    cooking_time=rng.randint(5, 180),
+                    pub_date=self.now - timedelta(
+                        seconds=rng.randint(0, period)
+                    ),
+                )
+                for number in range(start, start + count)
+            ]
+            Recipe.objects.bulk_create(recipes)
+            if recipes[0].pk is None:
+                recipes = list(Recipe.objects.filter(
+                    name__in=[recipe.name for recipe in recipes]
+                ).order_by('pk').only('pk'))
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in rng.sample(
+                    self.ingredient_ids, ingredients
+                )
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in rng.sample(
+                    self.tag_ids, rng.randint(1, min(3, len(self.tag_ids)))
+                )
+            )
+            return [recipe.pk for recipe in recipes]
+
+        # Даты публикации распределяются по периоду, а не ставятся
+        # текущим временем, как при обычном создании рецепта.
+        pub_date.auto_now_add = False
+        try:
+            chunks = self.run_parallel(create, self.options['recipes'])
+        finally:
+            pub_date.auto_now_add = True
+        return [pk for chunk in chunks for pk in chunk]
+
+    def create_relations(self, model, per_user):
+        per_user = min(per_user, len(self.recipe_ids))
+        if per_user <= 0:
+            return
+
+        def create(rng, start, count):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in self.user_ids[start:start + count]
+                    for recipe_id in rng.sample(self.recipe_ids, per_user)
+                ),
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+
+        self.run_parallel(create, len(self.user_ids))
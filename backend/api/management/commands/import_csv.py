@@ -1,30 +1,195 @@
-"""Модуль с логикой терминальной команды для импорта CSV файла."""
+"""Модуль с логикой терминальной команды для импорта данных из файла."""
 import csv
+import json
+import os
+from io import StringIO
+from itertools import islice
+from time import monotonic
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from recipes.models import Ingredient, Tag
 
+# Модель, уникальное поле для поиска записи и обновляемые поля.
 table = {
-    'ingredient': Ingredient,
-    'tag': Tag,
+    'ingredient': (Ingredient, 'name', ('measurement_unit',)),
+    'tag': (Tag, 'slug', ('name',)),
 }
 
 
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_json(file):
+    yield from json.load(file)
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+readers = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_jsonl,
+}
+
+
+def clean_row(row, number, fields):
+    """Значения полей строки; отсутствующее поле - ошибка команды."""
+    if not isinstance(row, dict):
+        raise CommandError(f'Строка {number}: ожидается объект с полями')
+    for field in fields:
+        # У строки CSV короче заголовка недостающие значения равны None.
+        if row.get(field) is None:
+            raise CommandError(f'Строка {number}: нет поля {field}')
+    return {field: str(row[field]).strip() for field in fields}
+
+
+def get_batches(rows, batch_size):
+    rows = iter(rows)
+    batch = list(islice(rows, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, batch_size))
+
+
 class Command(BaseCommand):
-    help = 'Добавление данных из CSV-файла в базу данных'
+    help = (
+        'Добавление и обновление данных из CSV, JSON или JSONL-файла '
+        'в базе данных'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Путь к CSV-файлу')
-        parser.add_argument('object_class', type=str, help='Класс объекта')
+        parser.add_argument('csv_file', type=str, help='Путь к файлу')
+        parser.add_argument(
+            'object_class', type=str, choices=table, help='Класс объекта'
+        )
+        parser.add_argument(
+            '--format',
+            choices=readers,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной пачке',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже для PostgreSQL',
+        )
 
     def handle(self, *args, **kwargs):
         csv_file = kwargs['csv_file']
-        object_class = kwargs['object_class']
+        model, key, fields = table[kwargs['object_class']]
+        file_format = kwargs['format'] or os.path.splitext(
+            csv_file
+        )[1].lstrip('.').lower()
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        use_copy = (
+            connection.vendor == 'postgresql' and not kwargs['no_copy']
+        )
 
+        started = monotonic()
         with open(csv_file, 'r', encoding='UTF-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                table[object_class].objects.create(**row)
+            rows = (
+                clean_row(row, number, (key, *fields))
+                for number, row in enumerate(
+                    readers[file_format](file), start=1
+                )
+            )
+            with transaction.atomic():
+                if use_copy:
+                    total, changed = self.copy_rows(
+                        model, key, fields, rows, kwargs['batch_size']
+                    )
+                else:
+                    total, changed = self.load_rows(
+                        model, key, fields, rows, kwargs['batch_size']
+                    )
+        elapsed = monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные добавлены успешно: обработано строк {total}, '
+            f'добавлено или изменено {changed} за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
+
+    def load_rows(self, model, key, fields, rows, batch_size):
+        """Загрузка пачками через bulk_create и bulk_update."""
+        total = changed = 0
+        for batch in get_batches(rows, batch_size):
+            total += len(batch)
+            batch = {row[key]: row for row in batch}
+            updated = []
+            for instance in model.objects.filter(
+                **{f'{key}__in': list(batch)}
+            ).only(key, *fields):
+                row = batch.pop(getattr(instance, key))
+                if any(getattr(instance, field) != row[field]
+                       for field in fields):
+                    for field in fields:
+                        setattr(instance, field, row[field])
+                    updated.append(instance)
+            model.objects.bulk_update(updated, fields)
+            created = model.objects.bulk_create(
+                [model(**row) for row in batch.values()],
+                ignore_conflicts=True,
+            )
+            changed += len(updated) + len(created)
+        return total, changed
 
-        self.stdout.write(self.style.SUCCESS('Данные добавлены успешно'))
+    def copy_rows(self, model, key, fields, rows, batch_size):
+        """Загрузка через COPY во временную таблицу и INSERT ON CONFLICT."""
+        db_table = connection.ops.quote_name(model._meta.db_table)
+        columns = [
+            connection.ops.quote_name(model._meta.get_field(name).column)
+            for name in (key, *fields)
+        ]
+        key_column = columns[0]
+        column_list = ', '.join(columns)
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE import_rows ('
+                + ', '.join(f'{column} text' for column in columns)
+                + ') ON COMMIT DROP'
+            )
+            for batch in get_batches(rows, batch_size):
+                total += len(batch)
+                buffer = StringIO()
+                writer = csv.writer(buffer)
+                for row in batch:
+                    writer.writerow(row[name] for name in (key, *fields))
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY import_rows ({column_list}) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+            updates = ', '.join(
+                f'{column} = EXCLUDED.{column}' for column in columns[1:]
+            )
+            current = ', '.join(
+                f'{db_table}.{column}' for column in columns[1:]
+            )
+            excluded = ', '.join(
+                f'EXCLUDED.{column}' for column in columns[1:]
+            )
+            cursor.execute(
+                f'INSERT INTO {db_table} ({column_list}) '
+                f'SELECT DISTINCT ON ({key_column}) {column_list} '
+                f'FROM import_rows '
+                f'ON CONFLICT ({key_column}) DO UPDATE SET {updates} '
+                f'WHERE ({current}) IS DISTINCT FROM ({excluded})'
+            )
+            changed = cursor.rowcount
+        return total, changed
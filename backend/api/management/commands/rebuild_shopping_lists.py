@@ -0,0 +1,63 @@
+"""Модуль с командой пересборки агрегированных списков покупок."""
+from math import isclose
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка списков покупок по корзинам пользователей '
+        'с отчётом о расхождениях'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить расхождения, не изменяя данные',
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            actual = {
+                (user_id, ingredient_id): (amount, recipes_count)
+                for user_id, ingredient_id, amount, recipes_count
+                in ShoppingListItem.objects.get_actual_rows()
+            }
+            stored = {
+                (user_id, ingredient_id): (amount, recipes_count)
+                for user_id, ingredient_id, amount, recipes_count
+                in ShoppingListItem.objects.select_for_update().values_list(
+                    'user_id', 'ingredient_id', 'amount', 'recipes_count'
+                )
+            }
+            missing = actual.keys() - stored.keys()
+            extra = stored.keys() - actual.keys()
+            changed = [
+                key for key in actual.keys() & stored.keys()
+                if actual[key][1] != stored[key][1]
+                or not isclose(actual[key][0], stored[key][0], abs_tol=1e-6)
+            ]
+            self.stdout.write(
+                f'Строк в списках покупок: {len(actual)}. '
+                f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+                f'с неверными значениями: {len(changed)}.'
+            )
+            if kwargs['dry_run']:
+                return
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=amount, recipes_count=recipes_count,
+                    )
+                    for (user_id, ingredient_id), (amount, recipes_count)
+                    in actual.items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
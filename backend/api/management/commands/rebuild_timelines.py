@@ -0,0 +1,77 @@
+"""Модуль с командой сверки лент подписок."""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from recipes.models import TimelineEntry
+from users.models import Follow
+from api.timeline import add_entries, get_fanned_out_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка лент подписок с подписками пользователей: удаление '
+        'лишних записей и добавление последних рецептов авторов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить расхождения, не изменяя данные',
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            # Записи без подписки и записи авторов, рецепты которых
+            # выбираются при чтении ленты.
+            extra = TimelineEntry.objects.annotate(
+                followed=Exists(Follow.objects.filter(
+                    user=OuterRef('user'),
+                    following=OuterRef('recipe__author'),
+                ))
+            ).filter(
+                Q(followed=False)
+                | Q(recipe__author__followers_count__gt=(
+                    settings.TIMELINE_FANOUT_LIMIT
+                ))
+            )
+            extra_count = extra.count()
+
+            followers = defaultdict(list)
+            for user_id, author_id in Follow.objects.values_list(
+                'user_id', 'following_id'
+            ).iterator():
+                followers[author_id].append(user_id)
+            missing = defaultdict(list)
+            for author_id, user_ids in followers.items():
+                recipes = list(get_fanned_out_recipes().filter(
+                    author_id=author_id
+                ).order_by('-pub_date', '-id').values_list(
+                    'pk', 'pub_date'
+                )[:settings.TIMELINE_BACKFILL_LIMIT])
+                if not recipes:
+                    continue
+                existing = set(TimelineEntry.objects.filter(
+                    recipe_id__in=[pk for pk, _ in recipes]
+                ).values_list('user_id', 'recipe_id'))
+                for user_id in user_ids:
+                    for recipe in recipes:
+                        if (user_id, recipe[0]) not in existing:
+                            missing[user_id].append(recipe)
+            self.stdout.write(
+                f'Лишних записей в лентах: {extra_count}, '
+                f'отсутствует: '
+                f'{sum(len(recipes) for recipes in missing.values())}.'
+            )
+            if kwargs['dry_run']:
+                return
+            TimelineEntry.objects.filter(
+                pk__in=list(extra.values_list('pk', flat=True))
+            ).delete()
+            for user_id, recipes in missing.items():
+                add_entries([user_id], recipes)
+        self.stdout.write(self.style.SUCCESS('Ленты подписок сверены'))
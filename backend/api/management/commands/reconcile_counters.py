@@ -0,0 +1,63 @@
+"""Модуль с командой сверки денормализованных счётчиков."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import CustomUser, Follow
+
+# Модель со счётчиком, поле счётчика, считаемая модель и её внешний ключ.
+counters = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Follow, 'following'),
+)
+
+
+def count_related(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка счётчиков избранного, корзин, рецептов и подписчиков '
+        'с исправлением расхождений'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить расхождения, не изменяя данные',
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            for model, field, related_model, related_field in counters:
+                actual = count_related(related_model, related_field)
+                drifted = list(
+                    model.objects.select_for_update().annotate(
+                        actual=actual
+                    ).exclude(**{field: F('actual')}).values_list(
+                        'pk', flat=True
+                    )
+                )
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}.{field}: '
+                    f'расхождений {len(drifted)}.'
+                )
+                if drifted and not kwargs['dry_run']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{field: actual}
+                    )
+        if not kwargs['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены'))
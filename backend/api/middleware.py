@@ -0,0 +1,139 @@
+"""Модуль с middleware учёта SQL-запросов и времени ответа."""
+import json
+import logging
+import re
+from collections import Counter
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.performance')
+
+# Списки параметров IN (%s, %s, ...) сворачиваются, чтобы запросы,
+# отличающиеся только числом значений, давали один отпечаток.
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'[^']*'|\b\d+\b")
+
+
+def get_fingerprint(sql):
+    """Отпечаток запроса без значений параметров."""
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Обёртка выполнения запросов, считающая их количество и время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+            self.statements.append(sql)
+
+
+class QueryBudgetMiddleware:
+    """
+    Учёт запросов к базе и времени обработки каждого запроса.
+
+    Для каждого ответа считаются количество SQL-запросов, время в базе,
+    время представления, время сериализации и общее время. Они
+    добавляются в заголовок Server-Timing и пишутся в лог строкой JSON.
+    Если маршрут превысил свой бюджет из QUERY_BUDGETS, в лог
+    записывается предупреждение с самыми частыми отпечатками SQL.
+
+    Время сериализации складывается из работы представления без учёта
+    запросов к базе и рендеринга ответа: сериализаторы DRF вычисляют
+    выборки лениво, поэтому отделить их точнее нельзя. Запросы,
+    выполняемые при чтении потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        request._query_recorder = recorder
+        request._timings = {'started': perf_counter()}
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        timings = request._timings
+        timings['finished'] = perf_counter()
+        self.report(request, response, recorder, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_timings'):
+            request._timings['view_started'] = perf_counter()
+            request._timings['view_db'] = request._query_recorder.duration
+
+    def process_template_response(self, request, response):
+        if hasattr(request, '_timings'):
+            request._timings['view_finished'] = perf_counter()
+            request._timings['view_db'] = (
+                request._query_recorder.duration
+                - request._timings['view_db']
+            )
+        return response
+
+    def get_budget(self, request, route):
+        budgets = settings.QUERY_BUDGETS
+        return budgets.get(
+            f'{request.method} {route}',
+            budgets.get(route, settings.QUERY_BUDGET_DEFAULT),
+        )
+
+    def report(self, request, response, recorder, timings):
+        finished = timings['finished']
+        view_started = timings.get('view_started', timings['started'])
+        view_finished = timings.get('view_finished', finished)
+        view_db = timings.get('view_db', 0.0)
+        if 'view_finished' not in timings:
+            view_db = recorder.duration - view_db
+        total = finished - timings['started']
+        view = view_finished - view_started
+        serializer = max(view - view_db, 0) + finished - view_finished
+        match = request.resolver_match
+        route = match.url_name if match else None
+        budget = self.get_budget(request, route)
+
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"',
+            f'view;dur={view * 1000:.1f}',
+            f'serializer;dur={serializer * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'budget': budget,
+            'db_ms': round(recorder.duration * 1000, 1),
+            'view_ms': round(view * 1000, 1),
+            'serializer_ms': round(serializer * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if budget is not None and recorder.count > budget:
+            fingerprints = Counter(
+                get_fingerprint(sql) for sql in recorder.statements
+            )
+            record['fingerprints'] = [
+                {'sql': sql, 'count': count}
+                for sql, count in fingerprints.most_common(
+                    settings.QUERY_BUDGET_FINGERPRINTS
+                )
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
@@ -1,6 +1,142 @@
 """Модуль с кастомными пагинациями проекта."""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import WhereNode
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from foodgram_backend.settings import PAGE_SIZE
+from .timeline import get_feed_ids
+from .utils import get_keyset_filter
+
+
+def get_estimated_count(queryset):
+    """
+    Оценка числа строк выборки по статистике планировщика PostgreSQL.
+
+    Для других СУБД возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def is_lightly_filtered(queryset):
+    """
+    Фильтруется ли выборка только сравнениями столбцов своей таблицы.
+
+    Для соединений и подзапросов оценка планировщика бывает далека от
+    действительного числа строк.
+    """
+    query = queryset.query
+    nodes = [query.where]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, WhereNode):
+            nodes.extend(node.children)
+        elif not (
+            isinstance(node, Lookup)
+            and isinstance(node.lhs, Col)
+            and node.lhs.alias == query.base_table
+            and not hasattr(node.rhs, 'resolve_expression')
+        ):
+            return False
+    return True
+
+
+class ApproximatePage(Page):
+    """Страница, наличие следующей страницы у которой известно по выборке."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Пагинатор с приблизительным подсчётом больших выборок.
+
+    Если выборка без соединений и подзапросов в фильтрах и планировщик
+    оценивает её не меньше чем в APPROXIMATE_COUNT_THRESHOLD строк,
+    вместо COUNT(*) выводится эта оценка, а признак count_exact
+    сбрасывается. Оценка только показывается: границы страниц по ней не
+    проверяются, а наличие следующей страницы определяется выборкой на
+    одну строку больше размера страницы. На последней странице число
+    строк известно точно и выводится вместо оценки.
+    """
+
+    count_exact = True
+
+    @cached_property
+    def estimated_count(self):
+        """Оценка числа строк или None, если их нужно считать точно."""
+        if not hasattr(self.object_list, 'query') or not is_lightly_filtered(
+            self.object_list
+        ):
+            return None
+        estimate = get_estimated_count(self.object_list)
+        if estimate is None or estimate < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return estimate
+
+    @cached_property
+    def count(self):
+        if self.estimated_count is not None:
+            self.count_exact = False
+            return self.estimated_count
+        return super().count
+
+    def validate_number(self, number):
+        if self.estimated_count is None:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        if self.estimated_count is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        has_next = len(rows) > self.per_page
+        if not has_next:
+            self.count = bottom + len(rows)
+            self.count_exact = True
+        return ApproximatePage(rows[:self.per_page], number, self, has_next)
 
 
 class LimitPageNumberPaginator(PageNumberPagination):
@@ -8,3 +144,128 @@ class LimitPageNumberPaginator(PageNumberPagination):
 
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class RecipeCursorPaginator(LimitPageNumberPaginator):
+    """
+    Пагинатор рецептов с дополнительным режимом курсора.
+
+    По умолчанию работает постранично через page и limit. Если в запросе
+    есть параметр cursor (для первой страницы пустой), страница
+    выбирается по ключу (pub_date, id) от последнего рецепта предыдущей
+    страницы, без OFFSET и подсчёта общего количества, поэтому время
+    ответа не зависит от глубины.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_by_cursor(queryset, request)
+
+    def paginate_by_cursor(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        results = self.get_cursor_results(
+            queryset, position, reverse, page_size + 1
+        )
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.results = results
+        return results
+
+    def get_cursor_results(self, queryset, position, reverse, limit):
+        """Рецепты после позиции курсора в порядке обхода."""
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by('-pub_date', '-id')
+        if position is not None:
+            queryset = queryset.filter(get_keyset_filter(position, reverse))
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.results:
+            return None
+        return self.get_cursor_link(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.results:
+            return None
+        return self.get_cursor_link(self.results[0], reverse=True)
+
+    def get_cursor_link(self, recipe, reverse):
+        cursor = f'{recipe.pub_date.isoformat()}|{recipe.pk}|{int(reverse)}'
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def decode_cursor(self, request):
+        """Позиция (pub_date, id) и направление из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = base64.urlsafe_b64decode(encoded.encode()).decode()
+            pub_date, pk, reverse = cursor.split('|')
+            position = (parse_datetime(pub_date), int(pk))
+            reverse = bool(int(reverse))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+
+class FeedCursorPaginator(RecipeCursorPaginator):
+    """
+    Пагинатор ленты подписок.
+
+    Всегда работает в режиме курсора: страница выбирается из ленты
+    пользователя, а рецепты загружаются по id из переданной выборки.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = True
+        return self.paginate_by_cursor(queryset, request)
+
+    def get_cursor_results(self, queryset, position, reverse, limit):
+        recipe_ids = get_feed_ids(self.request.user, position, reverse, limit)
+        recipes = queryset.in_bulk(recipe_ids)
+        return [recipes[pk] for pk in recipe_ids if pk in recipes]
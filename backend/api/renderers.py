@@ -0,0 +1,101 @@
+"""Модуль с рендерерами для выгрузки списка покупок."""
+import csv
+import json
+from datetime import datetime
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Список выдаётся по частям методом stream, который принимает итератор
+    строк с полями name, measurement_unit и amount. Метод render
+    используется только для служебных ответов, например ошибок.
+    """
+
+    charset = 'utf-8'
+    fields = ('name', 'measurement_unit', 'amount')
+
+    def stream(self, rows, user):
+        raise NotImplementedError
+
+    def get_filename(self, user):
+        return f'{user.username}_shopping_list.{self.format}'
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в виде текстового файла."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+    def stream(self, rows, user):
+        today = datetime.today()
+        yield (
+            f'Список покупок для: {user.get_full_name()}\n\n'
+            f'Дата: {today:%Y-%m-%d}\n\n'
+        )
+        separator = ''
+        for row in rows:
+            yield (
+                f'{separator}- {row["name"]} '
+                f'({row["measurement_unit"]}) - {row["amount"]}'
+            )
+            separator = '\n'
+        yield f'\n\nFoodgram ({today:%Y})'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        writer = csv.writer(Echo())
+        return (
+            writer.writerow(data.keys()) + writer.writerow(data.values())
+        ).encode(self.charset)
+
+    def stream(self, rows, user):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields)
+        for row in rows:
+            yield writer.writerow(row[field] for field in self.fields)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в виде JSON-массива."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, rows, user):
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(
+                {field: row[field] for field in self.fields},
+                ensure_ascii=False,
+            )
+            separator = ',\n'
+        yield ']'
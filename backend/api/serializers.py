@@ -1,4 +1,6 @@
 """Модуль с сериализаторами проекта."""
+from django.conf import settings
+from django.db import transaction
 from rest_framework import exceptions, serializers
 from rest_framework.reverse import reverse
 from djoser.serializers import UserSerializer
@@ -9,7 +11,11 @@ from recipes.models import (
     Tag, Favorite, ShoppingCart,
     RecipeShortLink
 )
-from .utils import Base64ImageField, get_request_or_user
+from .cache import recipe_cache
+from .utils import (
+    Base64ImageField, ImageVariantsField, get_following_ids,
+    get_request_or_user
+)
 
 
 class CustomUserReadSerializer(UserSerializer):
@@ -21,18 +27,18 @@ class CustomUserReadSerializer(UserSerializer):
         read_only=True,
     )
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_images = ImageVariantsField(source='avatar')
 
     class Meta:
         model = CustomUser
-        fields = UserSerializer.Meta.fields + ('is_subscribed', 'avatar',)
+        fields = UserSerializer.Meta.fields + (
+            'is_subscribed', 'avatar', 'avatar_images', 'followers_count',
+        )
         read_only_fields = ('id', 'is_subscribed', 'avatar',)
 
     def get_is_subscribed(self, obj):
         """Подписан ли пользователь на автора."""
-        user = get_request_or_user(self.context, 'user')
-        if user is None:
-            return False
-        return Follow.objects.filter(user=user, following=obj).exists()
+        return obj.pk in get_following_ids(self.context)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -77,18 +83,21 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField()
+    images = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time',)
+                  'is_in_shopping_cart', 'name', 'image', 'images', 'text',
+                  'cooking_time', 'favorites_count', 'shopping_cart_count',)
 
     def get_is_favorited(self, obj):
         """Добавлен ли рецепт в Избранное."""
         user = get_request_or_user(self.context, 'user')
         if user is None:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (
             Favorite.objects.filter(user=user, recipe=obj).exists()
         )
@@ -98,15 +107,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         user = get_request_or_user(self.context, 'user')
         if user is None:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
 
 class RecipeGetSerializer(serializers.ModelSerializer):
     """Сериализатор для представления данных о рецепте."""
 
+    images = ImageVariantsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -202,22 +215,59 @@ class RecipePostUpdateSerializer(serializers.ModelSerializer):
                 amount=ingredient['amount'], )
             for ingredient in ingredients
         ])
+        # Ингредиенты создаются через bulk_create без сигналов: нового
+        # рецепта ещё нет в корзинах, а кэш рецепта сбрасывается явно.
+        recipe_cache.invalidate(f'recipe:{recipe.pk}')
         return recipe
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         return self.add_ingredient_tag(ingredients, tags, recipe)
 
-    def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
+    def update_ingredients(self, recipe, new_amounts):
+        """
+        Изменение ингредиентов рецепта только там, где они отличаются.
+
+        Строки сохраняются через модель, чтобы сигналы RecipeIngredient
+        учли изменения в списках покупок.
+        """
+        kept = set()
+        removed = []
+        for recipe_ingredient in recipe.recipeingredients.all():
+            ingredient_id = recipe_ingredient.ingredient_id
+            if ingredient_id in kept or ingredient_id not in new_amounts:
+                # Повторные строки одного ингредиента тоже удаляются.
+                removed.append(recipe_ingredient.pk)
+                continue
+            kept.add(ingredient_id)
+            if recipe_ingredient.amount != new_amounts[ingredient_id]:
+                recipe_ingredient.amount = new_amounts[ingredient_id]
+                recipe_ingredient.save(update_fields=('amount',))
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        for ingredient_id in new_amounts.keys() - kept:
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=new_amounts[ingredient_id],
+            )
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         super().update(instance, validated_data)
-        return self.add_ingredient_tag(ingredients, tags, instance)
+        self.update_ingredients(instance, {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        })
+        # set() сам сравнивает тэги и меняет только отличающиеся связи.
+        instance.tags.set(tags)
+        recipe_cache.invalidate(f'recipe:{instance.pk}')
+        return instance
 
     def to_representation(self, value):
         """Выбор сериализатора для вывода результата работы класса."""
@@ -267,13 +317,24 @@ class FavoriteSerializer(BaseRecipeRelationSerializer):
         fields = ('user', 'recipe',)
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+    def validate_ids(self, value):
+        """Удаление повторов с сохранением порядка."""
+        return list(dict.fromkeys(value))
+
+
 class UserRecipeSerializer(CustomUserReadSerializer):
     """Сериализатор для представления рецептов пользователя."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        read_only=True, source='recipes.count'
-    )
 
     class Meta:
         model = CustomUser
@@ -283,17 +344,20 @@ class UserRecipeSerializer(CustomUserReadSerializer):
         )
 
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj)
-        request = get_request_or_user(self.context)
-        # сделал ещё get_request_attribute в utils.py не смогу решить какой
-        # из методов лучше подойдёт.
-        recipes_limit = request.query_params.get('recipes_limit')
-        try:
-            if recipes_limit is not None:
-                recipes_limit_int = int(recipes_limit)
-                queryset = queryset[:recipes_limit_int]
-        except ValueError:
-            pass
+        if hasattr(obj, 'limited_recipes'):
+            queryset = obj.limited_recipes
+        else:
+            queryset = Recipe.objects.filter(author=obj).order_by(
+                '-pub_date', '-id'
+            )
+            request = get_request_or_user(self.context)
+            recipes_limit = request.query_params.get('recipes_limit')
+            try:
+                if recipes_limit is not None:
+                    recipes_limit_int = int(recipes_limit)
+                    queryset = queryset[:recipes_limit_int]
+            except ValueError:
+                pass
         return RecipeGetSerializer(
             queryset, many=True, context=self.context
         ).data
@@ -331,6 +395,9 @@ class FollowSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        # Сигнал подписки увеличивает счётчик запросом update, поэтому
+        # загруженный до вставки автор хранит прежнее значение.
+        instance.following.refresh_from_db(fields=['followers_count'])
         serializer = UserRecipeSerializer(
             instance.following, context=self.context
         )
@@ -352,8 +419,7 @@ class ShortLinkSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RecipeShortLink
-        fields = ('original_url',)
-        write_only_fields = ('original_url',)
+        fields = ('recipe',)
 
     def get_short_link(self, obj):
         request = self.context['request']
@@ -0,0 +1,238 @@
+"""Модуль с обработчиками сигналов моделей."""
+from threading import local
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag
+)
+from users.models import CustomUser, Follow
+from .cache import GLOBAL_TAG, invalidate_recipe_lists, recipe_cache
+from .catalogs import ingredient_catalog, tag_catalog
+from .images import schedule_release, schedule_variants
+from .indexes import pantry_index
+from .timeline import backfill, followers_changed, prune, schedule_fan_out
+from .utils import get_short_link_target
+
+
+# Рецепты, удаляемые в текущем потоке. Их ингредиенты удаляются
+# каскадом, а из списков покупок рецепт целиком вычитается при удалении
+# корзин, поэтому отдельные строки ингредиентов уже не учитываются.
+deleting_recipes = local()
+
+
+def get_deleting_recipes():
+    if not hasattr(deleting_recipes, 'ids'):
+        deleting_recipes.ids = set()
+    return deleting_recipes.ids
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счётчика без чтения строки."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def remember_old_file(instance, field_name, update_fields):
+    """Сохранение прежнего имени файла для освобождения после замены."""
+    if instance.pk is None or (
+        update_fields is not None and field_name not in update_fields
+    ):
+        return
+    instance._old_file_name = type(instance).objects.filter(
+        pk=instance.pk
+    ).values_list(field_name, flat=True).first()
+
+
+def release_old_file(instance, field_name):
+    old_name = getattr(instance, '_old_file_name', None)
+    if old_name and old_name != getattr(instance, field_name).name:
+        schedule_release(old_name)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, update_fields=None, **kwargs):
+    remember_old_file(instance, 'image', update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    recipe_cache.invalidate(f'recipe:{instance.pk}')
+    # Ингредиенты сохраняются в той же транзакции после рецепта, поэтому
+    # индекс обновляется после коммита.
+    pantry_index.schedule_refresh(instance.pk)
+    if update_fields is None or 'image' in update_fields:
+        schedule_variants(instance.image.name)
+        release_old_file(instance, 'image')
+    if created:
+        change_counter(CustomUser, instance.author_id, 'recipes_count', 1)
+        invalidate_recipe_lists(instance.author_id)
+        schedule_fan_out(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    get_deleting_recipes().add(instance.pk)
+    transaction.on_commit(get_short_link_target.cache_clear)
+    recipe_cache.invalidate(f'recipe:{instance.pk}')
+    invalidate_recipe_lists(
+        instance.author_id,
+        instance.tags.values_list('slug', flat=True),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    get_deleting_recipes().discard(instance.pk)
+    change_counter(CustomUser, instance.author_id, 'recipes_count', -1)
+    pantry_index.schedule_refresh(instance.pk)
+    schedule_release(instance.image.name)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance - тэг, pk_set - id рецептов.
+        recipe_ids = pk_set or instance.recipes.values_list('pk', flat=True)
+        recipe_cache.invalidate(
+            f'list:tag:{instance.slug}',
+            *(f'recipe:{pk}' for pk in recipe_ids),
+        )
+        return
+    if action == 'pre_clear':
+        tags = instance.tags.all()
+    else:
+        tags = Tag.objects.filter(pk__in=pk_set)
+    recipe_cache.invalidate(f'recipe:{instance.pk}')
+    invalidate_recipe_lists(
+        instance.author_id, tags.values_list('slug', flat=True)
+    )
+
+
+def get_recipe_ingredient_row(instance):
+    return instance.recipe_id, instance.ingredient_id, instance.amount
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(sender, instance, **kwargs):
+    instance._old_row = None
+    if instance.pk is not None:
+        instance._old_row = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    ShoppingListItem.objects.update_recipe_ingredient(
+        getattr(instance, '_old_row', None),
+        get_recipe_ingredient_row(instance),
+    )
+    recipe_ingredient_changed(instance)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if instance.recipe_id not in get_deleting_recipes():
+        ShoppingListItem.objects.update_recipe_ingredient(
+            get_recipe_ingredient_row(instance), None
+        )
+    recipe_ingredient_changed(instance)
+
+
+def recipe_ingredient_changed(instance):
+    recipe_cache.invalidate(f'recipe:{instance.recipe_id}')
+    pantry_index.schedule_refresh(instance.recipe_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    recipe_cache.invalidate(f'tag:{instance.pk}', f'list:tag:{instance.slug}')
+    transaction.on_commit(tag_catalog.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    recipe_cache.invalidate(GLOBAL_TAG)
+    transaction.on_commit(ingredient_catalog.invalidate)
+
+
+@receiver(pre_save, sender=CustomUser)
+def author_saving(sender, instance, update_fields=None, **kwargs):
+    remember_old_file(instance, 'avatar', update_fields)
+
+
+@receiver(post_delete, sender=CustomUser)
+def author_removed(sender, instance, **kwargs):
+    schedule_release(instance.avatar.name)
+
+
+@receiver(post_save, sender=CustomUser)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    recipe_cache.invalidate(f'author:{instance.pk}')
+    if update_fields is None or 'avatar' in update_fields:
+        schedule_variants(instance.avatar.name)
+        release_old_file(instance, 'avatar')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', 1)
+        ShoppingListItem.objects.add_recipes(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    ShoppingListItem.objects.remove_recipes(
+        instance.user_id, [instance.recipe_id]
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            CustomUser, instance.following_id, 'followers_count', 1
+        )
+        followers_changed([instance.following_id], 1)
+        backfill(instance.user_id, [instance.following_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    change_counter(CustomUser, instance.following_id, 'followers_count', -1)
+    followers_changed([instance.following_id], -1)
+    prune(instance.user_id, [instance.following_id])
@@ -0,0 +1,87 @@
+"""Модуль с хранилищем файлов, адресуемых по содержимому."""
+import fcntl
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LOCKS_DIR = '.locks'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с дедупликацией загрузок.
+
+    Файлы из каталогов CONTENT_ADDRESSED_DIRS сохраняются под именем,
+    равным хэшу содержимого, в подкаталогах по первым символам хэша.
+    Одинаковые файлы хранятся один раз, а повторная загрузка возвращает
+    имя уже существующего файла. Остальные файлы сохраняются как обычно.
+
+    Общий файл может быть удалён запросом, освобождающим последнюю
+    ссылку на него, пока ссылка из текущей транзакции ещё не закоммичена.
+    Поэтому после коммита файл проверяется и при необходимости
+    записывается заново. Проверка, запись и удаление файлов выполняются
+    под блокировкой имени, общей для всех процессов.
+    """
+
+    hash_name = 'sha256'
+
+    @contextmanager
+    def lock(self, name):
+        """Межпроцессная блокировка имени файла."""
+        directory = self.path(LOCKS_DIR)
+        os.makedirs(directory, exist_ok=True)
+        # Блокировки распределены по 256 файлам, чтобы их число не росло.
+        stripe = hashlib.sha256(name.encode()).hexdigest()[:2]
+        with open(os.path.join(directory, stripe), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_content_addressed(self, name):
+        return os.path.dirname(name) in settings.CONTENT_ADDRESSED_DIRS
+
+    def get_hashed_name(self, name, content):
+        hasher = hashlib.new(self.hash_name)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest[2:4],
+            f'{digest}{extension}',
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not self.is_content_addressed(name):
+            return super().save(name, content, max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        with self.lock(name):
+            if not self.exists(name):
+                name = self._save(name, content)
+        transaction.on_commit(lambda: self.restore(name, content))
+        return name
+
+    def restore(self, name, content):
+        """Повторная запись файла, удалённого до коммита ссылки на него."""
+        with self.lock(name):
+            if self.exists(name):
+                return
+            try:
+                content.seek(0)
+                self._save(name, content)
+            except (OSError, ValueError):
+                logger.exception('Не удалось восстановить файл %s', name)
@@ -0,0 +1,98 @@
+"""Модуль с тестами пакетного добавления в избранное, корзину и подписки."""
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem
+)
+from users.models import CustomUser, Follow
+
+
+class BulkAddTests(TestCase):
+    """Побочные эффекты пакетного добавления применяются один раз."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        cls.authors = [
+            CustomUser.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='password',
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко')
+        ]
+        cls.recipes = []
+        for number, author in enumerate(cls.authors):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipe/images/recipe.png',
+            )
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counters_actual(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count(),
+            )
+            self.assertEqual(
+                recipe.shopping_cart_count,
+                ShoppingCart.objects.filter(recipe=recipe).count(),
+            )
+        for author in CustomUser.objects.all():
+            self.assertEqual(
+                author.followers_count,
+                Follow.objects.filter(following=author).count(),
+            )
+        self.assertCountEqual(
+            ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount', 'recipes_count'
+            ),
+            ShoppingListItem.objects.get_actual_rows(),
+        )
+
+    def add_all(self):
+        """Добавление, часть записей в котором уже существует."""
+        first, *others = self.recipes
+        Favorite.objects.create(user=self.user, recipe=first)
+        ShoppingCart.objects.create(user=self.user, recipe=first)
+        Follow.objects.create(user=self.user, following=self.authors[0])
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        author_ids = [author.pk for author in self.authors]
+        for url, ids in (
+            ('/api/recipes/bulk/favorite/', recipe_ids),
+            ('/api/recipes/bulk/shopping_cart/', recipe_ids),
+            ('/api/users/bulk/subscribe/', author_ids),
+        ):
+            response = self.client.post(url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [result['status'] for result in response.data['results']],
+                ['exists', 'added', 'added'],
+            )
+        self.assert_counters_actual()
+
+    def test_insert_returning(self):
+        self.add_all()
+
+    def test_insert_fallback(self):
+        with mock.patch('api.bulk.can_return_inserted', return_value=False):
+            self.add_all()
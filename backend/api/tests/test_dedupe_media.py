@@ -0,0 +1,48 @@
+"""Модуль с тестами команды dedupe_media."""
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from recipes.models import Recipe
+from users.models import CustomUser
+from api.images import get_variant_name
+
+
+class DeleteOrphansTests(TestCase):
+    """Удаление файлов без ссылок из каталогов по хэшу."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = CustomUser.objects.create_user(
+            username='author', email='author@example.com',
+            password='password',
+        )
+
+    def save(self, content):
+        return default_storage.save(
+            'recipe/images/image.png', ContentFile(content)
+        )
+
+    def test_orphans_in_sharded_directories_are_deleted(self):
+        used = self.save(b'used')
+        orphan = self.save(b'orphan')
+        variant = default_storage.save(
+            get_variant_name(used, 'small'), ContentFile(b'variant')
+        )
+        Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image=used,
+        )
+        call_command('dedupe_media', delete_orphans=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(used))
+        self.assertTrue(default_storage.exists(variant))
+        self.assertFalse(default_storage.exists(orphan))
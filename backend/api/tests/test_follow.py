@@ -0,0 +1,32 @@
+"""Модуль с тестами подписок на авторов."""
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import CustomUser
+
+
+class SubscribeTests(TestCase):
+    """Подписка на автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        cls.author = CustomUser.objects.create_user(
+            username='author', email='author@example.com',
+            password='password',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscribe_returns_actual_followers_count(self):
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(response.data['followers_count'], 1)
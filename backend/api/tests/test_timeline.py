@@ -0,0 +1,63 @@
+"""Модуль с тестами лент подписок."""
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import CustomUser, Follow
+from api.timeline import get_feed_ids
+
+
+def run_now(function, *args):
+    function(*args)
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=1)
+@mock.patch('api.timeline.schedule_task', run_now)
+class FanOutThresholdTests(TestCase):
+    """Ленты подписчиков автора, переходящего порог рассылки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.other = (
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password',
+            )
+            for name in ('author', 'reader', 'other')
+        )
+
+    def create_recipe(self, number):
+        return Recipe.objects.create(
+            author=self.author, name=f'Рецепт {number}', text='Текст',
+            cooking_time=10, image='recipe/images/recipe.png',
+        )
+
+    def get_feed(self, user):
+        return set(get_feed_ids(user, None, False, 10))
+
+    def get_entries(self, user):
+        return set(TimelineEntry.objects.filter(user=user).values_list(
+            'recipe_id', flat=True
+        ))
+
+    def test_crossing_threshold(self):
+        first = self.create_recipe(1)
+        Follow.objects.create(user=self.reader, following=self.author)
+        self.assertEqual(self.get_entries(self.reader), {first.pk})
+
+        # Автор переходит порог вверх: записи удаляются из лент,
+        # рецепты читаются напрямую.
+        Follow.objects.create(user=self.other, following=self.author)
+        self.assertEqual(self.get_entries(self.reader), set())
+        second = self.create_recipe(2)
+        self.assertEqual(self.get_feed(self.reader), {first.pk, second.pk})
+
+        # Автор опускается до порога: рецепты, опубликованные, пока он
+        # читался напрямую, дописываются в ленты оставшихся подписчиков.
+        Follow.objects.get(user=self.other).delete()
+        self.assertEqual(
+            self.get_entries(self.reader), {first.pk, second.pk}
+        )
+        self.assertEqual(self.get_feed(self.reader), {first.pk, second.pk})
+        self.assertEqual(self.get_feed(self.other), set())
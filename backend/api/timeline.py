@@ -0,0 +1,196 @@
+"""Модуль с лентой рецептов авторов из подписок пользователя."""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import CustomUser, Follow
+from .utils import get_keyset_filter
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.TIMELINE_WORKERS, thread_name_prefix='timeline'
+)
+# Переносы авторов через порог выполняются по одному в порядке коммитов,
+# чтобы очистка и заполнение лент одного автора не чередовались.
+threshold_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='timeline-threshold'
+)
+
+
+def get_fanned_out_recipes():
+    """
+    Рецепты, раскладываемые по лентам подписчиков при публикации.
+
+    Рецепты авторов, у которых подписчиков больше TIMELINE_FANOUT_LIMIT,
+    в ленты не записываются и выбираются при чтении ленты.
+    """
+    return Recipe.objects.filter(
+        author__followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+    )
+
+
+def add_entries(user_ids, recipes):
+    """Запись рецептов (id, дата публикации) в ленты пользователей."""
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for user_id in user_ids
+            for pk, pub_date in recipes
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(recipe_id):
+    """Добавление рецепта в ленты всех подписчиков автора."""
+    try:
+        recipe = get_fanned_out_recipes().filter(pk=recipe_id).values_list(
+            'author_id', 'pub_date'
+        ).first()
+        if recipe is None:
+            return
+        author_id, pub_date = recipe
+        add_entries(
+            Follow.objects.filter(following_id=author_id).values_list(
+                'user_id', flat=True
+            ),
+            [(recipe_id, pub_date)],
+        )
+    except Exception:
+        logger.exception('Не удалось добавить рецепт %s в ленты', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(recipe_id):
+    """Рассылка рецепта по лентам в фоне после коммита."""
+    transaction.on_commit(lambda: executor.submit(fan_out, recipe_id))
+
+
+def backfill(user_id, author_ids):
+    """
+    Добавление в ленту пользователя последних рецептов новых авторов.
+
+    От каждого автора берётся не больше TIMELINE_BACKFILL_LIMIT рецептов.
+    """
+    for author_id in author_ids:
+        add_entries([user_id], get_fanned_out_recipes().filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list('pk', 'pub_date')[
+            :settings.TIMELINE_BACKFILL_LIMIT
+        ])
+
+
+def prune(user_id, author_ids):
+    """Удаление рецептов авторов из ленты пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def run_task(function, *args):
+    """Выполнение задачи лент в фоновом потоке."""
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Не удалось выполнить %s%s', function.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule_task(function, *args):
+    transaction.on_commit(
+        lambda: threshold_executor.submit(run_task, function, *args)
+    )
+
+
+def fill_author(author_id):
+    """Добавление последних рецептов автора в ленты всех подписчиков."""
+    recipes = list(get_fanned_out_recipes().filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-id').values_list('pk', 'pub_date')[
+        :settings.TIMELINE_BACKFILL_LIMIT
+    ])
+    if recipes:
+        add_entries(
+            Follow.objects.filter(following_id=author_id).values_list(
+                'user_id', flat=True
+            ),
+            recipes,
+        )
+
+
+def clear_author(author_id):
+    """Удаление рецептов автора, читаемых напрямую, из всех лент."""
+    if CustomUser.objects.filter(
+        pk=author_id, followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).exists():
+        TimelineEntry.objects.filter(recipe__author_id=author_id).delete()
+
+
+def followers_changed(author_ids, delta):
+    """
+    Перенос авторов через порог TIMELINE_FANOUT_LIMIT.
+
+    Вызывается после изменения followers_count авторов на delta (+1 или
+    -1) в той же транзакции. Счётчик меняется на единицу под блокировкой
+    строки, поэтому значение сразу за порогом видит ровно одно изменение.
+    Автор, перешедший порог вверх, читается напрямую и его записи
+    удаляются из лент. Автор, опустившийся до порога, снова раскладывается
+    по лентам, и в них дописываются рецепты, опубликованные за время,
+    пока он читался напрямую.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    crossed = limit + 1 if delta > 0 else limit
+    task = clear_author if delta > 0 else fill_author
+    for author_id in CustomUser.objects.filter(
+        pk__in=author_ids, followers_count=crossed
+    ).values_list('pk', flat=True):
+        schedule_task(task, author_id)
+
+
+def get_feed_ids(user, position, reverse, limit):
+    """
+    id рецептов ленты пользователя после позиции (pub_date, id) курсора.
+
+    Записи ленты читаются одним проходом по индексу timeline_feed_idx.
+    Рецепты авторов, не раскладываемые по лентам, выбираются по индексу
+    рецептов автора, и обе последовательности сливаются по дате.
+    """
+    if reverse:
+        ordering = ('pub_date', 'recipe_id')
+    else:
+        ordering = ('-pub_date', '-recipe_id')
+    entries = TimelineEntry.objects.filter(user=user)
+    if position is not None:
+        entries = entries.filter(
+            get_keyset_filter(position, reverse, 'recipe_id')
+        )
+    sources = [list(entries.order_by(*ordering).values_list(
+        'pub_date', 'recipe_id'
+    )[:limit])]
+    large_author_ids = list(Follow.objects.filter(
+        user=user,
+        following__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('following_id', flat=True))
+    if large_author_ids:
+        recipes = Recipe.objects.filter(author_id__in=large_author_ids)
+        if position is not None:
+            recipes = recipes.filter(get_keyset_filter(position, reverse))
+        sources.append(list(recipes.order_by(
+            *(field.replace('recipe_id', 'id') for field in ordering)
+        ).values_list('pub_date', 'id')[:limit]))
+    # Рецепт автора, число подписчиков которого перешло через порог,
+    # может оказаться в обеих последовательностях.
+    recipe_ids = {}
+    for _, recipe_id in heapq.merge(*sources, reverse=not reverse):
+        recipe_ids.setdefault(recipe_id)
+        if len(recipe_ids) == limit:
+            break
+    return list(recipe_ids)
@@ -1,9 +1,15 @@
 """Модуль дополнительными утилитами."""
-import base64
+import uuid
+from functools import lru_cache
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db.models import Q
 from rest_framework import serializers
 
+from recipes.models import RecipeShortLink
+from users.models import Follow
+from .images import decode_base64_file, get_variant_urls
+
 
 class Base64ImageField(serializers.ImageField):
     """Сериализатор для обработки передамаваемых  изображений."""
@@ -13,11 +19,22 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_file(imgstr, f'{uuid.uuid4().hex}.{ext}')
 
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return get_variant_urls(value, self.context.get('request'))
+
+
 def get_request_or_user(context, value=None):
     """Проверка на наличие request и user в контексте."""
     if 'request' not in context:
@@ -30,6 +47,27 @@ def get_request_or_user(context, value=None):
     return request.user
 
 
+def get_following_ids(context):
+    """Множество id авторов, на которых подписан текущий пользователь.
+
+    Вычисляется одним запросом и кэшируется на объекте request, поэтому
+    все вложенные сериализаторы пользователей используют общий результат.
+    """
+    user = get_request_or_user(context, 'user')
+    if user is None:
+        return frozenset()
+    request = context['request']
+    following_ids = getattr(request, '_following_ids', None)
+    if following_ids is None:
+        following_ids = frozenset(
+            Follow.objects.filter(user=user).values_list(
+                'following_id', flat=True
+            )
+        )
+        request._following_ids = following_ids
+    return following_ids
+
+
 def get_request_attribute(context, attribute=None):
     """Проверка на наличие request, user и доп. атрибута в контексте."""
     if 'request' not in context:
@@ -43,3 +81,26 @@ def get_request_attribute(context, attribute=None):
     if not attribute:
         return None
     return attribute
+
+
+def get_keyset_filter(position, reverse, pk_field='pk'):
+    """Условие выборки строк после позиции (pub_date, id) курсора."""
+    pub_date, pk = position
+    lookup = 'gt' if reverse else 'lt'
+    return Q(**{f'pub_date__{lookup}': pub_date}) | Q(
+        pub_date=pub_date, **{f'{pk_field}__{lookup}': pk}
+    )
+
+
+@lru_cache(maxsize=settings.SHORT_LINK_CACHE_SIZE)
+def get_short_link_target(short_link):
+    """
+    Адрес перехода по короткой ссылке с кэшем в памяти процесса.
+
+    Отсутствующая ссылка вызывает RecipeShortLink.DoesNotExist, а
+    исключения lru_cache не запоминает, поэтому новые ссылки доступны
+    сразу после создания.
+    """
+    return RecipeShortLink.objects.only('recipe', 'original_url').get(
+        short_link=short_link
+    ).get_target_url()
@@ -1,34 +1,48 @@
 """Модуль с основными views."""
-from datetime import datetime
-import uuid
+from itertools import chain
 
-from django.http import HttpResponse
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.db.models import (
+    Exists, F, OuterRef, Prefetch, Subquery
+)
 from django.shortcuts import get_object_or_404, redirect
-from rest_framework import status, viewsets, filters
+from rest_framework import status, viewsets
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.reverse import reverse
-from rest_framework.filters import SearchFilter
 from djoser.views import UserViewSet
 from django_filters import rest_framework as rest_filters
 
 from users.models import CustomUser, Follow
 from recipes.models import (
     Ingredient, Tag, Recipe, ShoppingCart, Favorite, RecipeIngredient,
-    RecipeShortLink
+    RecipeShortLink, ShoppingListItem
+)
+from .bulk import add_follows, add_recipe_relations
+from .cache import get_response_tags, recipe_cache
+from .catalogs import (
+    get_catalog_response, ingredient_catalog, tag_catalog
+)
+from .indexes import ingredient_index, pantry_index
+from .paginations import (
+    FeedCursorPaginator, LimitPageNumberPaginator, RecipeCursorPaginator
+)
+from .renderers import (
+    ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+    ShoppingListTextRenderer,
 )
-from .paginations import LimitPageNumberPaginator
 from .serializers import (
     RecipeSerializer, ShortLinkSerializer,
-    RecipePostUpdateSerializer,
+    RecipePostUpdateSerializer, RecipeGetSerializer,
     IngredientSerializer, TagSerializer,
     ShoppingCartSerializer,
     FavoriteSerializer,
-    FollowSerializer, AvatarSerializer,
+    FollowSerializer, AvatarSerializer, BulkIdsSerializer,
 )
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .utils import get_short_link_target
 from .filters import (
     RecipeFilter,
 )
@@ -58,6 +72,7 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False, methods=['put'], url_path='me/avatar',
             permission_classes=[IsAuthorOrAdminOrReadOnly])
+    @transaction.atomic
     def avatar(self, request, *args, **kwargs):
         """Добавление-обновление аватара пользователя."""
         user = request.user
@@ -71,7 +86,8 @@ class CustomUserViewSet(UserViewSet):
         """Удаление аватара пользователя."""
         user = request.user
         if user.avatar:
-            user.avatar.delete()
+            # Файл удаляется сигналом, если на него больше нет ссылок.
+            user.avatar = None
             user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -83,9 +99,25 @@ class CustomUserViewSet(UserViewSet):
     def get_subscriptions(self, request):
         """Просмотр листа подписок пользователя."""
         user = request.user
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is not None and recipes_limit.isdigit():
+            # Последние N рецептов каждого автора страницы одним запросом.
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date', '-id').values('pk')[
+                    :int(recipes_limit)
+                ]
+            ))
+        authors = CustomUser.objects.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
         following = Follow.objects.filter(
             user=user
-        ).prefetch_related('following').order_by('id')
+        ).prefetch_related(
+            Prefetch('following', queryset=authors)
+        ).order_by('id')
         page = self.paginate_queryset(following)
         if page is not None:
             serializer = self.get_serializer(
@@ -113,6 +145,18 @@ class CustomUserViewSet(UserViewSet):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(
+        detail=False, methods=['POST'], url_path='bulk/subscribe',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_subscribe(self, request):
+        """Подписка на список авторов с результатом по каждому."""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': add_follows(
+            request.user, serializer.validated_data['ids']
+        )})
+
     @post_subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
         """Отписка от автора."""
@@ -138,9 +182,12 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
-    filter_backends = (rest_filters.DjangoFilterBackend,
-                       SearchFilter)
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return get_catalog_response(request, ingredient_catalog)
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -151,21 +198,69 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = (AllowAny,)
 
+    def list(self, request, *args, **kwargs):
+        return get_catalog_response(request, tag_catalog)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Описание логики работы АПИ для эндпоинта Recipe."""
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
-    pagination_class = LimitPageNumberPaginator
-    filter_backends = (rest_filters.DjangoFilterBackend, filters.SearchFilter)
+    pagination_class = RecipeCursorPaginator
+    filter_backends = (rest_filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        # C queryset не очень понял, надеюсь я всё таки верный вывод
-        return self.queryset.select_related('author').prefetch_related(
-            'ingredients', 'tags'
-        ).order_by('-pub_date')
+        queryset = self.queryset.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        ).order_by('-pub_date', '-id')
+        user = self.request.user
+        if user.is_authenticated:
+            # Флаги избранного и корзины вычисляются в том же запросе,
+            # что и страница рецептов, а не отдельным запросом на рецепт.
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        return queryset
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """Ответ из общего кэша для анонимных пользователей."""
+        key = None
+        if request.user.is_anonymous:
+            key = recipe_cache.get_key(request, self.action, kwargs.get('pk'))
+        if key is None:
+            return handler(request, *args, **kwargs)
+        data = recipe_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            recipe_cache.set(
+                key, response.data,
+                recipe_cache.get_scope_tags(request, self.action)
+                | get_response_tags(response.data),
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         """Получение сериализатора для работы с Рецептами."""
@@ -173,7 +268,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return FavoriteSerializer
         elif self.action == 'shopping_cart':
             return ShoppingCartSerializer
-        elif self.action in ['list', 'retrieve']:
+        elif self.action in ['list', 'retrieve', 'feed']:
             return RecipeSerializer
         return RecipePostUpdateSerializer
 
@@ -192,6 +287,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(user=request.user, recipe=recipe,)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def bulk_add_model(self, model):
+        """Вспомогательная функция для пакетного добавления рецептов."""
+        serializer = BulkIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': add_recipe_relations(
+            model, self.request.user, serializer.validated_data['ids']
+        )})
+
     def delete_model(self, model, pk=None):
         """Вспомогательная функция для удаление модели."""
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -227,41 +330,121 @@ class RecipeViewSet(viewsets.ModelViewSet):
         model_name = ShoppingCart
         return self.delete_model(model_name, pk)
 
-    @action(methods=['get'], detail=False, url_name='download',)
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk/shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        """Добавление списка рецептов в корзину."""
+        return self.bulk_add_model(ShoppingCart)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_name='download',
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ),
+    )
     def download_shopping_cart(self, request):
-        """Подготавливает и возвращает файл со списком покупок."""
+        """Выгружает список покупок в формате txt, csv или json."""
         user = request.user
-
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-        )
-
-        if not ingredients:
-            return HttpResponse(
-                'Ваш список покупок пуст.', content_type='text/plain'
+        renderer = request.accepted_renderer
+
+        rows = (
+            ShoppingListItem.objects.filter(user=user)
+            .values(
+                'amount',
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit'),
             )
-
-        today = datetime.today()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+            .order_by('name', 'measurement_unit')
+            .iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+        )
+        first_row = next(rows, None)
+        if first_row is None:
+            if renderer.format == ShoppingListTextRenderer.format:
+                return HttpResponse(
+                    'Ваш список покупок пуст.', content_type='text/plain'
+                )
+            rows = iter(())
+        else:
+            rows = chain((first_row,), rows)
+
+        response = StreamingHttpResponse(
+            renderer.stream(rows, user),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        filename = renderer.get_filename(user)
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
         return response
 
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='feed',
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedCursorPaginator,
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, от новых к старым."""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='pantry',
+        permission_classes=(AllowAny,),
+    )
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов."""
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+            limit = int(request.query_params.get('limit', settings.PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {'error': 'Ожидались числовые id ингредиентов и лимит'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'error': 'Не указаны ингредиенты'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), settings.PANTRY_MAX_RESULTS)
+        matches = pantry_index.search(ingredient_ids, limit)
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        ingredients = ingredient_catalog.get_snapshot().rows_by_id
+        results = []
+        for recipe_id, matched, missing in matches:
+            if recipe_id not in recipes:
+                continue
+            results.append({
+                'recipe': RecipeGetSerializer(
+                    recipes[recipe_id], context={'request': request}
+                ).data,
+                'coverage': round(matched / (matched + len(missing)), 3),
+                'matched_count': matched,
+                'missing_ingredients': [
+                    ingredients[pk] for pk in missing if pk in ingredients
+                ],
+            })
+        return Response(results)
+
     @action(
         detail=True,
         methods=['post'],
@@ -277,20 +460,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         model_name = Favorite
         return self.delete_model(model_name, pk)
 
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk/favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        """Добавление списка рецептов в избранное."""
+        return self.bulk_add_model(Favorite)
+
     @action(
         methods=['get'], detail=True, url_path='get-link', url_name='get_link'
     )
     def get_link(self, request, pk=None):
         """Получение короткой ссылки на рецепт."""
-        self.get_object()
-        original_url = request.META.get('HTTP_REFERER')
-        if original_url is None:
-            url = reverse('api:recipes-detail', kwargs={'pk': pk})
-            original_url = request.build_absolute_uri(url)
-
+        recipe = self.get_object()
         short_link_instance, _ = RecipeShortLink.objects.get_or_create(
-            original_url=original_url,
-            defaults={'short_link': str(uuid.uuid4())[:3]}
+            recipe=recipe
         )
         serializer = ShortLinkSerializer(
             short_link_instance,
@@ -301,7 +488,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def retrieve_by_short_link(self, request, short_link=None):
         """Получение рецепта по короткой ссылке."""
-        recipe = get_object_or_404(
-            RecipeShortLink, short_link=short_link
-        ).original_url
-        return redirect(recipe)
+        try:
+            url = get_short_link_target(short_link)
+        except RecipeShortLink.DoesNotExist:
+            raise Http404
+        return redirect(url)
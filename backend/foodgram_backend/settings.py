@@ -16,6 +16,14 @@ from pathlib import Path
 
 PAGE_SIZE = 10
 
+# Начиная с этой оценки числа строк, пагинатор не считает их точно.
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 10000)
+)
+
+# Размер пачки строк при потоковой выгрузке списка покупок.
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +103,98 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Кэш ответов с рецептами для анонимных пользователей.
+    # Для нескольких воркеров gunicorn используйте общий бэкенд,
+    # например django.core.cache.backends.filebased.FileBasedCache.
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPES_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RECIPES_CACHE_LOCATION', 'recipes'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+RECIPES_CACHE_ALIAS = 'recipes'
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+# Время жизни справочников тэгов и ингредиентов в памяти воркера
+# и срок кэширования их на клиенте, в секундах.
+CATALOG_TTL = int(os.getenv('CATALOG_TTL', 300))
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', 3600))
+
+# Время жизни обратного индекса рецептов по ингредиентам в воркере
+# и размер пачки строк при его построении.
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 600))
+PANTRY_INDEX_CHUNK_SIZE = 10000
+PANTRY_MAX_RESULTS = 50
+
+# Лента подписок. Рецепты авторов, у которых подписчиков не больше
+# TIMELINE_FANOUT_LIMIT, записываются в ленты подписчиков в фоне при
+# публикации, рецепты более популярных авторов выбираются при чтении.
+# При подписке в ленту добавляется TIMELINE_BACKFILL_LIMIT последних
+# рецептов автора, столько же дописывается во все ленты при возврате
+# автора к порогу.
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', 10000))
+TIMELINE_BACKFILL_LIMIT = int(os.getenv('TIMELINE_BACKFILL_LIMIT', 200))
+TIMELINE_BATCH_SIZE = 5000
+TIMELINE_WORKERS = int(os.getenv('TIMELINE_WORKERS', 2))
+
+# Наибольшее число id в одном пакетном запросе.
+BULK_MAX_ITEMS = 100
+
+# Число коротких ссылок, хранимых в памяти воркера для редиректов.
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+
+# Учёт SQL-запросов и времени ответа: заголовок Server-Timing, строки
+# лога api.performance и бюджеты числа запросов по имени маршрута
+# ('recipes-list') или методу и маршруту ('PATCH recipes-detail').
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', 'True') == 'True'
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+QUERY_BUDGET_FINGERPRINTS = 5
+QUERY_BUDGETS = {
+    'recipes-list': 8,
+    'GET recipes-detail': 8,
+    'recipes-detail': 40,
+    'recipes-download': 5,
+    'recipes-favorite': 15,
+    'recipes-shopping-cart': 15,
+    'recipes-feed': 8,
+    'recipes-bulk-favorite': 8,
+    'recipes-bulk-shopping-cart': 15,
+    'users-list': 6,
+    'users-detail': 6,
+    'users-me': 6,
+    'users-get-subscriptions': 8,
+    'tags-list': 3,
+    'ingredients-list': 3,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -136,6 +237,22 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки из этих каталогов хранятся по хэшу содержимого без дублей.
+DEFAULT_FILE_STORAGE = 'api.storages.ContentAddressedStorage'
+CONTENT_ADDRESSED_DIRS = ('recipe/images', 'users/image')
+
+# Обработка загружаемых изображений: ограничение размера, число потоков
+# фоновой обработки и размеры уменьшенных копий.
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -6,15 +6,19 @@ from .models import (
     Favorite, Ingredient,
     RecipeIngredient, Recipe,
     ShoppingCart, Tag,
-    RecipeShortLink
+    RecipeShortLink, ShoppingListItem
 )
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'id', 'author', 'added_in_favorites')
+    list_display = (
+        'name', 'id', 'author', 'added_in_favorites', 'shopping_cart_count'
+    )
     readonly_fields = ('added_in_favorites',)
     list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author', 'tags')
     search_fields = (
         'author__email',
         'author__last_name',
@@ -23,9 +27,11 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
     )
 
-    @display(description='Количество в избранных')
+    @display(
+        description='Количество в избранных', ordering='favorites_count'
+    )
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
@@ -43,6 +49,8 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__last_name',
@@ -52,9 +60,23 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount', 'recipes_count')
+    list_select_related = ('user', 'ingredient')
+    autocomplete_fields = ('user', 'ingredient')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'ingredient__name',
+    )
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__last_name',
@@ -67,6 +89,8 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'get_amount_with_unit',)
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
     search_fields = (
         'recipe__name',
         'ingredient__name',
@@ -75,5 +99,7 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
 
 @admin.register(RecipeShortLink)
 class RecipeShortLinkAdmin(admin.ModelAdmin):
-    list_display = ('short_link', 'original_url')
-    search_fields = ('short_link', 'original_url')
+    list_display = ('short_link', 'recipe', 'original_url')
+    list_select_related = ('recipe',)
+    autocomplete_fields = ('recipe',)
+    search_fields = ('short_link', 'recipe__name', 'original_url')
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def restore_search(using, **kwargs):
+    """Восстановление поискового индекса SQLite после миграций."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        from .search import install_search
+        install_search(connection)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        post_migrate.connect(restore_search, sender=self)
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:50
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+RECIPE_URL = re.compile(r'/recipes/(\d+)/?$')
+
+
+def link_recipes(apps, schema_editor):
+    """Привязка старых ссылок к рецептам по адресу страницы рецепта."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeShortLink = apps.get_model('recipes', 'RecipeShortLink')
+    linked = set()
+    for short_link in RecipeShortLink.objects.order_by('id'):
+        match = RECIPE_URL.search(short_link.original_url)
+        if match is None:
+            continue
+        recipe_id = int(match.group(1))
+        if recipe_id in linked or not Recipe.objects.filter(
+            pk=recipe_id
+        ).exists():
+            continue
+        short_link.recipe_id = recipe_id
+        short_link.save(update_fields=('recipe',))
+        linked.add(recipe_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_auto_20261017_0649'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeshortlink',
+            name='recipe',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='short_link', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipeshortlink',
+            name='original_url',
+            field=models.CharField(blank=True, max_length=256, verbose_name='Оригинальная ссылка'),
+        ),
+        migrations.AlterField(
+            model_name='recipeshortlink',
+            name='short_link',
+            field=models.CharField(editable=False, max_length=16, unique=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(link_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:20
+
+from django.db import migrations
+
+from recipes.search import install_search, uninstall_search
+
+
+def install(apps, schema_editor):
+    install_search(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_auto_20261017_0700'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
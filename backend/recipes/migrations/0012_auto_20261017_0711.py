@@ -0,0 +1,67 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:11
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    Follow = apps.get_model('users', 'Follow')
+    followers = defaultdict(list)
+    for user_id, author_id in Follow.objects.filter(
+        following__followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user_id', 'following_id').iterator():
+        followers[author_id].append(user_id)
+    for author_id, user_ids in followers.items():
+        recipes = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list('pk', 'pub_date')[
+            :settings.TIMELINE_BACKFILL_LIMIT
+        ])
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+                )
+                for user_id in user_ids
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0011_recipeingredient_recipeingredient_filter_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты подписок',
+                'verbose_name_plural': 'Записи лент подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_feed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,28 @@
 """Модуль с моделями связанными с рецептами."""
-import uuid
+import string
+from collections import defaultdict
 
-from django.db import models
-from users.models import CustomUser
+from django.db import models, transaction
+from django.db.models import F
+from users.models import CounterFieldsMixin, CustomUser
 from django.core.validators import MinValueValidator
 
+SHORT_LINK_ALPHABET = string.digits + string.ascii_letters
+# Смещение, с которым новые коды занимают не меньше 4 символов и не
+# пересекаются со старыми трёхсимвольными кодами.
+SHORT_LINK_OFFSET = len(SHORT_LINK_ALPHABET) ** 3
+
+
+def encode_short_link(number):
+    """Кодирование числа в base62 со смещением SHORT_LINK_OFFSET."""
+    number += SHORT_LINK_OFFSET
+    base = len(SHORT_LINK_ALPHABET)
+    code = ''
+    while number:
+        number, remainder = divmod(number, base)
+        code = SHORT_LINK_ALPHABET[remainder] + code
+    return code
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -43,7 +61,7 @@ class Tag(models.Model):
         verbose_name_plural = 'Тэги'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE,
         related_name='recipes',
@@ -53,6 +71,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipe/images/',
         null=False,
+        db_index=True,
     )
     text = models.TextField()
     ingredients = models.ManyToManyField(Ingredient,
@@ -73,9 +92,28 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата добавления',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество в избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество в корзинах'
+    )
+
+    counter_fields = ('favorites_count', 'shopping_cart_count')
 
     class Meta:
         default_related_name = 'recipes'
+        indexes = [
+            # Лента рецептов и курсорная пагинация по (pub_date, id).
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_feed_idx'
+            ),
+            # Рецепты автора в фильтре и в подписках.
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_feed_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -99,12 +137,26 @@ class RecipeIngredient(models.Model):
     )
 
     class Meta:
+        indexes = [
+            # Сборка списков покупок по рецептам без чтения таблицы.
+            models.Index(
+                fields=('recipe', 'ingredient', 'amount'),
+                name='recipeingredient_amount_idx',
+            ),
+            # Фильтры рецептов по наличию и отсутствию ингредиентов.
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='recipeingredient_filter_idx',
+            ),
+        ]
         verbose_name = 'Ингридиент в рецепте'
         verbose_name_plural = 'Ингридиенты в рецепте'
 
     def __str__(self):
-        return f"{self.amount} {self.ingredient.measurement_unit} \
-    of {self.ingredient.name}"
+        return (
+            f'{self.amount} {self.ingredient.measurement_unit} '
+            f'of {self.ingredient.name}'
+        )
 
     def get_amount_with_unit(self):
         return f"{self.amount} {self.ingredient.measurement_unit}"
@@ -162,13 +214,193 @@ class ShoppingCart(models.Model):
         verbose_name_plural = 'Списки покупок'
 
 
+class ShoppingListItemManager(models.Manager):
+    """Менеджер для инкрементального обновления списков покупок."""
+
+    def apply_changes(self, user_ids, changes):
+        """
+        Применение изменений к спискам покупок пользователей.
+
+        changes - словарь {id ингредиента: (изменение количества,
+        изменение числа рецептов)}. Строки, в которых не осталось
+        рецептов, удаляются.
+        """
+        user_ids = list(user_ids)
+        if not user_ids or not changes:
+            return
+        grouped = defaultdict(list)
+        for ingredient_id, change in changes.items():
+            grouped[change].append(ingredient_id)
+        # Вызывается из сигналов внутри транзакции изменения, отдельная
+        # точка сохранения для каждого вызова не нужна.
+        with transaction.atomic(savepoint=False):
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=0, recipes_count=0,
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, (_, count) in changes.items()
+                    if count > 0
+                ],
+                ignore_conflicts=True,
+            )
+            for (amount, count), ingredient_ids in grouped.items():
+                self.filter(
+                    user_id__in=user_ids, ingredient_id__in=ingredient_ids
+                ).update(
+                    amount=F('amount') + amount,
+                    recipes_count=F('recipes_count') + count,
+                )
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=list(changes),
+                recipes_count__lte=0,
+            ).delete()
+
+    def get_actual_rows(self):
+        """Списки покупок, вычисленные заново по корзинам пользователей."""
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user'),
+        ).annotate(
+            total_amount=models.Sum('amount'),
+            total_recipes=models.Count('id'),
+        ).values_list(
+            'user_id', 'ingredient_id', 'total_amount', 'total_recipes'
+        )
+
+    def get_recipes_changes(self, recipe_ids, sign=1):
+        changes = defaultdict(lambda: (0, 0))
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            total, count = changes[ingredient_id]
+            changes[ingredient_id] = (total + sign * amount, count + sign)
+        return changes
+
+    def add_recipes(self, user_id, recipe_ids):
+        """Добавление ингредиентов рецептов в список покупок."""
+        self.apply_changes([user_id], self.get_recipes_changes(recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Удаление ингредиентов рецептов из списка покупок."""
+        self.apply_changes(
+            [user_id], self.get_recipes_changes(recipe_ids, sign=-1)
+        )
+
+    def update_recipe_ingredient(self, old, new):
+        """
+        Учёт изменения строки ингредиента рецепта во всех списках покупок.
+
+        old и new - (id рецепта, id ингредиента, количество) до и после
+        изменения, None для созданной или удалённой строки.
+        """
+        if old is not None and new is not None and old[:2] == new[:2]:
+            recipe_id, ingredient_id, amount = new
+            if amount != old[2]:
+                self.apply_changes(
+                    self.get_cart_user_ids(recipe_id),
+                    {ingredient_id: (amount - old[2], 0)},
+                )
+            return
+        for row, sign in ((old, -1), (new, 1)):
+            if row is not None:
+                recipe_id, ingredient_id, amount = row
+                self.apply_changes(
+                    self.get_cart_user_ids(recipe_id),
+                    {ingredient_id: (sign * amount, sign)},
+                )
+
+    def get_cart_user_ids(self, recipe_id):
+        return ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Строка списка покупок: сумма ингредиента по рецептам корзины."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингридиент'
+    )
+    amount = models.FloatField(verbose_name='Количество')
+    recipes_count = models.IntegerField(verbose_name='Количество рецептов')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт автора в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    # Копия даты публикации рецепта, чтобы страница ленты читалась
+    # одним проходом по индексу без соединения с рецептами.
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_feed_idx',
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+
+
 class RecipeShortLink(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='short_link',
+        verbose_name='Рецепт'
+    )
     short_link = models.CharField(
-        max_length=3, unique=True, editable=False,
+        max_length=16, unique=True, editable=False,
         verbose_name='Короткая ссылка'
     )
     original_url = models.CharField(
-        max_length=256, unique=True,
+        max_length=256, blank=True,
         verbose_name='Оригинальная ссылка'
     )
 
@@ -177,10 +409,16 @@ class RecipeShortLink(models.Model):
         verbose_name_plural = 'Ссылки'
 
     def __str__(self):
-        return f'{self.original_url} -> {self.short_link}'
+        return f'{self.get_target_url()} -> {self.short_link}'
+
+    def get_target_url(self):
+        """Адрес страницы рецепта, на который ведёт ссылка."""
+        if self.recipe_id is None:
+            return self.original_url
+        return f'/recipes/{self.recipe_id}'
 
     def save(self, *args, **kwargs):
-        """Переопределяем метод для генерации short_link перед сохранением."""
-        if not self.short_link:
-            self.short_link = str(uuid.uuid4())[:3]
+        """Код ссылки выводится из id рецепта и не требует повторов."""
+        if not self.short_link and self.recipe_id is not None:
+            self.short_link = encode_short_link(self.recipe_id)
         super().save(*args, **kwargs)
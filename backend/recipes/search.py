@@ -0,0 +1,145 @@
+"""Модуль с полнотекстовым поиском рецептов по названию и описанию."""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+WORD_RE = re.compile(r'\w+')
+
+POSTGRESQL_INSTALL = (
+    # Вектор вычисляется самой базой при любой записи рецепта, включая
+    # bulk_create и обновления в обход моделей.
+    f'''
+    ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector(
+            '{SEARCH_CONFIG}'::regconfig, coalesce(name, '')
+        ), 'A')
+        || setweight(to_tsvector(
+            '{SEARCH_CONFIG}'::regconfig, coalesce(text, '')
+        ), 'B')
+    ) STORED
+    ''',
+    'CREATE INDEX recipe_search_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+)
+POSTGRESQL_UNINSTALL = (
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': f'''
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END''',
+    'recipes_recipe_fts_delete': f'''
+        AFTER DELETE ON recipes_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}
+                ({SQLITE_FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+        END''',
+    'recipes_recipe_fts_update': f'''
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}
+                ({SQLITE_FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END''',
+}
+
+
+def install_search(connection):
+    """
+    Создание поискового индекса рецептов в базе.
+
+    В PostgreSQL это вычисляемый столбец tsvector с GIN-индексом. В
+    SQLite - таблица FTS5 с триггерами. SQLite пересоздаёт таблицу
+    рецептов при изменении её схемы и теряет триггеры, поэтому для неё
+    функция вызывается и после каждой миграции и восстанавливает только
+    недостающее.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'recipes_recipe'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing.issuperset(SQLITE_TRIGGERS):
+                return
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} '
+                'USING fts5(name, text, content=recipes_recipe, '
+                "content_rowid=id, tokenize='unicode61 remove_diacritics 2')"
+            )
+            for name, sql in SQLITE_TRIGGERS.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {sql}')
+            cursor.execute(
+                f"INSERT INTO {SQLITE_FTS_TABLE} ({SQLITE_FTS_TABLE}) "
+                "VALUES ('rebuild')"
+            )
+
+
+def uninstall_search(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_UNINSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+
+
+def search_recipes(queryset, value):
+    """
+    Рецепты, подходящие под поисковую строку, по убыванию релевантности.
+
+    Релевантность сохраняется в аннотации search_rank.
+    """
+    words = WORD_RE.findall(value)
+    if not words:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVectorField
+        )
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        vector = RawSQL(
+            'recipes_recipe.search_vector', (),
+            output_field=SearchVectorField(),
+        )
+        queryset = queryset.annotate(search_vector=vector).filter(
+            search_vector=query
+        ).annotate(search_rank=SearchRank(vector, query))
+    elif vendor == 'sqlite':
+        # Стемминга в FTS5 нет, поэтому слова ищутся по префиксу.
+        match = ' '.join(f'"{word}"*' for word in words)
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s', (match,),
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({SQLITE_FTS_TABLE}, 10.0, 1.0) '
+            f'FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s '
+            f'AND rowid = recipes_recipe.id', (match,),
+            output_field=FloatField(),
+        ))
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        queryset = queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -7,8 +7,11 @@ from .models import CustomUser, Follow
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'id', 'email', 'first_name', 'last_name')
-    list_filter = ('email', 'first_name')
+    list_display = (
+        'username', 'id', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
+    )
+    list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = (
         'username',
         'email',
@@ -26,4 +29,5 @@ class FollowAdmin(admin.ModelAdmin):
         'user__first_name', 'following__first_name',
         'user__email', 'following__email',
     )
-    list_filter = ('user', 'following')
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
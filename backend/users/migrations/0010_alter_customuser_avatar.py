@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_auto_20241207_1650'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='avatar',
+            field=models.ImageField(db_index=True, default=None, null=True, upload_to='users/image/'),
+        ),
+    ]
@@ -2,7 +2,30 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 
-class CustomUser(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Исключение счётчиков из полного сохранения модели.
+
+    Счётчики меняются только атомарными UPDATE с F(), поэтому save() без
+    update_fields не должен перезаписывать их устаревшими значениями
+    из памяти.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=254, unique=True, verbose_name='Электронная почта'
     )
@@ -24,8 +47,17 @@ class CustomUser(AbstractUser):
     avatar = models.ImageField(
         upload_to='users/image/',
         null=True,
-        default=None
+        default=None,
+        db_index=True,
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество рецептов'
     )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество подписчиков'
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'